@@ -0,0 +1,248 @@
+import io
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image
+from config import TMDB_REQUEST_TIMEOUT
+from metrics import metrics
+from scheduler import scheduler, BACKGROUND
+
+# numpy is optional; without it near-duplicate collapsing is unavailable
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Smallest TMDb size to download for hashing each image type
+HASH_THUMB_SIZES = {
+    "posters": "w92",
+    "backdrops": "w300",
+    "logos": "w92",
+}
+
+# Collapsed listings kept, keyed by their images and hashes
+COLLAPSED_CACHE_SIZE = 256
+
+# Set bits of each byte value, for numpy versions without bitwise_count
+_BYTE_BITS = None if np is None else np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dhash(data):
+    """Compute a 64-bit difference hash of an encoded image"""
+    with Image.open(io.BytesIO(data)) as image:
+        pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distances(values):
+    """Return the pairwise Hamming distances of an array of 64-bit hashes"""
+    xor = values[:, None] ^ values[None, :]
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return _BYTE_BITS[xor.view(np.uint8).reshape(len(values), len(values), 8)].sum(axis=-1, dtype=np.uint8)
+
+
+class PerceptualHashStore:
+    """Persists perceptual hashes keyed by TMDb file path in SQLite"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS phashes (file_path TEXT PRIMARY KEY, hash INTEGER)")
+
+    def _connection(self):
+        """Return the SQLite connection of the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, file_paths):
+        """Return stored hashes for the given file paths"""
+        hashes = {}
+        with self._connection() as conn:
+            for start in range(0, len(file_paths), 500):
+                chunk = file_paths[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT file_path, hash FROM phashes WHERE file_path IN ({placeholders})", chunk
+                ).fetchall()
+                # SQLite integers are signed, hashes are unsigned
+                hashes.update((file_path, value & 0xFFFFFFFFFFFFFFFF) for file_path, value in rows)
+        return hashes
+
+    def put_many(self, hashes):
+        """Store hashes for file paths"""
+        rows = [
+            (file_path, value - (1 << 64) if value >= (1 << 63) else value)
+            for file_path, value in hashes.items()
+        ]
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO phashes VALUES (?, ?)", rows)
+
+
+class ArtworkDeduplicator:
+    """Collapses near-duplicate artwork using perceptual hashes.
+
+    Each image is hashed once from a small thumbnail and the hash persisted.
+    Images of the same language whose hashes are within ``threshold`` bits
+    of each other are clustered, and each cluster is represented by its
+    largest image.
+    Images without a hash yet are listed as they are; unless the caller
+    waits for them, their hashes are computed as a background job.
+    """
+
+    def __init__(self, tmdb, store, threshold):
+        self.tmdb = tmdb
+        self.store = store
+        self.threshold = threshold
+        self._downloads = ThreadPoolExecutor(max_workers=8, thread_name_prefix="phash-download")
+        self._hashing = set()
+        self._hashing_lock = threading.Lock()
+        self._collapsed = OrderedDict()
+        self._collapsed_lock = threading.Lock()
+
+    def _hash_image(self, url):
+        """Download a thumbnail and hash it, returning None on failure"""
+        try:
+            response = self.tmdb.session.get(url, timeout=TMDB_REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                return None
+            return dhash(response.content)
+        except (requests.exceptions.RequestException, OSError) as e:
+            logger.warning(f"Error hashing artwork {url}: {e}")
+            return None
+
+    def _compute_hashes(self, image_type, file_paths):
+        """Download, hash and store the given images; return the new hashes"""
+        size = HASH_THUMB_SIZES.get(image_type, "w92")
+        urls = [f"{self.tmdb.image_base_url}/{size}{file_path}" for file_path in file_paths]
+        computed = {
+            file_path: value
+            for file_path, value in zip(file_paths, self._downloads.map(self._hash_image, urls))
+            if value is not None
+        }
+        metrics.increment("artwork_dedup.hashed", len(computed))
+        if computed:
+            self.store.put_many(computed)
+        return computed
+
+    def _compute_in_background(self, image_type, file_paths):
+        """Queue hashing of images not already being hashed"""
+        with self._hashing_lock:
+            file_paths = [file_path for file_path in file_paths if file_path not in self._hashing]
+            self._hashing.update(file_paths)
+        if not file_paths:
+            return
+
+        def compute():
+            try:
+                self._compute_hashes(image_type, file_paths)
+            finally:
+                with self._hashing_lock:
+                    self._hashing.difference_update(file_paths)
+
+        scheduler.submit(BACKGROUND, compute)
+
+    def get_hashes(self, image_type, file_paths, wait=True):
+        """Return perceptual hashes for file paths.
+
+        Missing hashes are computed before returning if ``wait`` is true,
+        and otherwise in the background for later calls.
+        """
+        hashes = self.store.get_many(file_paths)
+        missing = [file_path for file_path in file_paths if file_path not in hashes]
+        if missing:
+            if wait:
+                hashes.update(self._compute_hashes(image_type, missing))
+            else:
+                self._compute_in_background(image_type, missing)
+        return hashes
+
+    def _representatives(self, images, hashes, hashed):
+        """Return the indexes of the images that represent each cluster"""
+        # Union-find over near-duplicate pairs
+        parent = list(range(len(images)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        # Listings are browsed per language, so images only cluster with their own language
+        languages = {}
+        for index in hashed:
+            languages.setdefault(images[index].get('iso_639_1'), []).append(index)
+
+        for group in languages.values():
+            if len(group) < 2:
+                continue
+            values = np.array([hashes[images[index]['file_path']] for index in group], dtype=np.uint64)
+            distances = hamming_distances(values)
+            for a, b in np.argwhere(np.triu(distances <= self.threshold, k=1)):
+                root_a, root_b = find(group[a]), find(group[b])
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        # Keep the largest image of each cluster, in the position of the cluster's first image
+        best = {}
+        for index, image in enumerate(images):
+            root = find(index)
+            area = (image.get('width') or 0) * (image.get('height') or 0)
+            if root not in best or area > best[root][0]:
+                best[root] = (area, index)
+        return [best[root][1] for root in sorted(best)]
+
+    def collapse(self, image_type, images, wait=True):
+        """Return one representative per cluster of near-duplicate images"""
+        if len(images) < 2:
+            return images
+
+        hashes = self.get_hashes(image_type, [image['file_path'] for image in images], wait)
+        hashed = [index for index, image in enumerate(images) if image['file_path'] in hashes]
+        if len(hashed) < 2:
+            return images
+
+        # Listings are collapsed again on every page, so the clusters are cached
+        key = (image_type, tuple((image['file_path'], hashes.get(image['file_path'])) for image in images))
+        with self._collapsed_lock:
+            kept = self._collapsed.get(key)
+            if kept is not None:
+                self._collapsed.move_to_end(key)
+        if kept is None:
+            kept = self._representatives(images, hashes, hashed)
+            with self._collapsed_lock:
+                self._collapsed[key] = kept
+                if len(self._collapsed) > COLLAPSED_CACHE_SIZE:
+                    self._collapsed.popitem(last=False)
+
+        representatives = [images[index] for index in kept]
+        metrics.increment("artwork_dedup.collapsed", len(images) - len(representatives))
+        return representatives
+
+
+def create_deduplicator(tmdb, enabled, threshold, path):
+    """Create the artwork deduplicator, or None when disabled or unavailable"""
+    if not enabled:
+        return None
+    if np is None:
+        logger.warning("ARTWORK_DEDUP is enabled but numpy is not installed; duplicates will not be collapsed")
+        return None
+    return ArtworkDeduplicator(tmdb, PerceptualHashStore(path), threshold)
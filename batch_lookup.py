@@ -0,0 +1,107 @@
+import logging
+import re
+import threading
+import time
+from scheduler import scheduler, BULK
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Results listed per title
+MEDIA_TYPES = ("movie", "tv")
+
+
+def parse_titles(text, max_titles):
+    """Split a /batch message into distinct titles, keeping their order.
+
+    Titles are separated by new lines after the command. Repeats that
+    differ only in case or spacing are dropped. Returns (titles, number of
+    titles left out over max_titles).
+    """
+    lines = text.split("\n")
+    # The first line may hold a title after the command itself
+    lines[0] = re.sub(r"^/\S+", "", lines[0])
+
+    titles = []
+    seen = set()
+    for line in lines:
+        title = " ".join(line.split())
+        if not title or title.casefold() in seen:
+            continue
+        seen.add(title.casefold())
+        titles.append(title)
+    return titles[:max_titles], max(0, len(titles) - max_titles)
+
+
+def best_match(results):
+    """Return the top movie or TV result of a search, or None"""
+    if not results:
+        return None
+    for item in results.get("results", []):
+        if item.get("media_type") in MEDIA_TYPES:
+            return item
+    return None
+
+
+class BatchLookup:
+    """Resolves a list of titles concurrently and reports progress.
+
+    Each title is searched as a bulk job on the shared scheduler, so
+    lookups share the TMDb request budget and yield to interactive
+    requests. ``publish(results, done)`` is called with the results so
+    far, at most once per ``edit_interval`` seconds while lookups finish,
+    and always once when the last one is done.
+    """
+
+    def __init__(self, tmdb, titles, publish, edit_interval):
+        self.tmdb = tmdb
+        self.titles = titles
+        self.publish = publish
+        self.edit_interval = edit_interval
+        # Search result per title index: False while pending, None when not found
+        self.results = [False] * len(titles)
+        self._remaining = len(titles)
+        self._last_publish = 0.0
+        # Set once the final results are being published
+        self._finished = False
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def start(self):
+        """Queue a search for every title"""
+        for index, title in enumerate(self.titles):
+            future = scheduler.submit(BULK, self.tmdb.search_multi, title)
+            future.add_done_callback(lambda future, index=index: self._resolved(index, future))
+
+    def _resolved(self, index, future):
+        """Store the result of one search and publish progress if due"""
+        try:
+            match = best_match(future.result())
+        except Exception as e:
+            logger.error(f"Error looking up '{self.titles[index]}': {e}")
+            match = None
+
+        with self._lock:
+            self.results[index] = match
+            self._remaining -= 1
+            done = self._remaining == 0
+            now = time.monotonic()
+            if not done and now - self._last_publish < self.edit_interval:
+                return
+            self._last_publish = now
+
+        # The final update waits for any edit in progress; intermediate ones skip instead
+        if not self._publish_lock.acquire(blocking=done):
+            return
+        try:
+            # Progress that lost the race to the final update must not replace it
+            if self._finished:
+                return
+            self._finished = done
+            with self._lock:
+                results = list(self.results)
+            self.publish(results, done)
+        except Exception as e:
+            logger.error(f"Error publishing batch progress: {e}")
+        finally:
+            self._publish_lock.release()
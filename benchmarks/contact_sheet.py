@@ -0,0 +1,69 @@
+"""Benchmark contact sheet generation against the number of images.
+
+Usage: python -m benchmarks.contact_sheet [--counts 10,25,50,100,200] [--image-latency MS]
+
+For each image count, sheets are built end to end by ContactSheetService:
+thumbnails are downloaded from the local image stub of replay.py and
+composed on the process pool, with a new title each time so the sheet
+cache is missed. The time to compose the same thumbnails in this process,
+one sheet after another, is shown for comparison.
+"""
+import argparse
+import io
+import random
+import time
+
+from PIL import Image
+
+from replay import StubServer
+
+
+def thumbnail(size):
+    """Return a noisy JPEG thumbnail, which compresses like real artwork"""
+    image = Image.frombytes("RGB", size, random.randbytes(size[0] * size[1] * 3))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark contact sheet generation")
+    parser.add_argument("--counts", default="10,25,50,100,200", help="comma separated image counts")
+    parser.add_argument("--kind", default="posters", help="posters, backdrops or logos")
+    parser.add_argument("--image-latency", type=float, default=20, help="simulated image download latency in ms")
+    args = parser.parse_args()
+
+    from config import CONTACT_SHEET_MAX_IMAGES, CONTACT_SHEET_COLUMNS, CONTACT_SHEET_WORKERS
+    from contact_sheet import ContactSheetService, SHEET_LAYOUTS, compose_sheet
+    from tmdb_api import TMDbAPI
+
+    _, tile_size = SHEET_LAYOUTS[args.kind]
+    stub = StubServer({}, args.image_latency / 1000)
+    stub.image = thumbnail(tile_size)
+    tmdb = TMDbAPI()
+    tmdb.image_base_url = f"{stub.url}/img"
+    service = ContactSheetService(tmdb)
+
+    # Start the process pool before measuring
+    service.get_sheets("warm-up", args.kind, "en", ["/warm-up.jpg"])
+
+    print(f"{args.kind}: {CONTACT_SHEET_MAX_IMAGES} images per sheet, {CONTACT_SHEET_WORKERS} pool processes")
+    for count in [int(value) for value in args.counts.split(",")]:
+        file_paths = [f"/image{index}.jpg" for index in range(count)]
+        started = time.perf_counter()
+        sheets = service.get_sheets(f"title-{count}", args.kind, "en", file_paths)
+        end_to_end = time.perf_counter() - started
+
+        thumbnails = [stub.image] * count
+        started = time.perf_counter()
+        for start in range(0, count, CONTACT_SHEET_MAX_IMAGES):
+            compose_sheet(thumbnails[start:start + CONTACT_SHEET_MAX_IMAGES], start + 1, CONTACT_SHEET_COLUMNS, tile_size)
+        serial = time.perf_counter() - started
+
+        size = sum(len(sheet) for sheet in sheets)
+        print(f"{count:>4} images: {len(sheets)} sheet(s), {size / 1024:.0f} KiB, "
+              f"end to end {end_to_end * 1000:.0f}ms, compose in process {serial * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
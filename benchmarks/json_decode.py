@@ -0,0 +1,83 @@
+"""Benchmark decoding and compacting a large TMDb details payload.
+
+Usage: python -m benchmarks.json_decode [--payload details.json] [--images N] [--repeat N]
+
+Decodes the payload with the standard library json module and with orjson
+(when installed), with and without compact_details. Recordings hold the
+compacted bodies, so to use a real payload save one first, for example:
+curl "https://api.themoviedb.org/3/tv/1399?api_key=...&append_to_response=images" > details.json
+Without --payload, a synthetic details response with --images images of
+each kind is used.
+"""
+import argparse
+import json
+import time
+
+from tmdb_api import compact_details
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def synthetic_payload(images):
+    """Build a details response shaped like TMDb's, with many images"""
+    image = {
+        "aspect_ratio": 0.667, "height": 3000, "iso_639_1": "en", "file_path": "/abcdefghijklmnopqrstuvwxyz.jpg",
+        "vote_average": 5.384, "vote_count": 12, "width": 2000,
+    }
+    return {
+        "id": 1399, "name": "Game of Thrones", "overview": "Seven noble families fight for control. " * 10,
+        "first_air_date": "2011-04-17", "number_of_seasons": 8, "number_of_episodes": 73,
+        "vote_average": 8.4, "poster_path": "/poster.jpg", "backdrop_path": "/backdrop.jpg",
+        "genres": [{"id": 10765, "name": "Sci-Fi & Fantasy"}] * 3,
+        "production_companies": [{"id": 76043, "name": "Revolution Sun Studios", "logo_path": None}] * 5,
+        "seasons": [{"season_number": n, "name": f"Season {n}", "episode_count": 10, "overview": "x" * 200}
+                    for n in range(9)],
+        "images": {kind: [dict(image, file_path=f"/{kind}{i}.jpg") for i in range(images)]
+                   for kind in ("posters", "backdrops", "logos")},
+    }
+
+
+def measure(fn, payload, repeat):
+    """Return the best time of fn(payload) over repeat runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON decoding of TMDb payloads")
+    parser.add_argument("--payload", help="raw TMDb details response saved as JSON")
+    parser.add_argument("--images", type=int, default=500, help="images per kind in the synthetic payload")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    if args.payload:
+        with open(args.payload, "rb") as f:
+            payload = f.read()
+    else:
+        payload = json.dumps(synthetic_payload(args.images)).encode("utf-8")
+
+    decoders = {"json": json.loads}
+    if orjson is not None:
+        decoders["orjson"] = orjson.loads
+    else:
+        print("orjson is not installed; only the standard library is measured")
+
+    compacted = json.dumps(compact_details(json.loads(payload))).encode("utf-8")
+    print(f"Payload: {len(payload) / 1024:.0f} KiB, {len(compacted) / 1024:.0f} KiB after compaction")
+    for name, loads in decoders.items():
+        decode = measure(loads, payload, args.repeat)
+        decode_compact = measure(lambda data: compact_details(loads(data)), payload, args.repeat)
+        cached = measure(loads, compacted, args.repeat)
+        print(f"{name:>7}: decode {decode * 1000:.2f}ms ({len(payload) / decode / 1e6:.0f} MB/s), "
+              f"decode+compact {decode_compact * 1000:.2f}ms, decode cached {cached * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
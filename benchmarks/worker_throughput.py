@@ -0,0 +1,129 @@
+"""Benchmark update throughput of the multi-process mode for several worker counts.
+
+Usage: python -m benchmarks.worker_throughput traffic-*.jsonl.gz [--workers 1,2,4,8] [--copies N] [--tmdb-latency MS]
+
+Recorded updates are copied --copies times with distinct chat and user ids,
+so they spread over the workers like real traffic. They are routed by
+ClusterRouter to worker processes that share a SQLite cache, exactly as
+with BOT_WORKERS. The Telegram Bot API and TMDb are answered by the local
+stubs of replay.py. All updates are queued at once and the time until
+every worker has acknowledged them is measured. Rate limits are raised
+so that no update is dropped.
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+from replay import REPLAY_TOKEN, StubServer, load_records, response_key
+from traffic_recorder import is_identity
+
+
+def with_offset(data, offset):
+    """Return a copy of update data whose user and chat ids are moved by offset"""
+    data = copy.deepcopy(data)
+
+    def shift(value):
+        if isinstance(value, list):
+            for item in value:
+                shift(item)
+        elif isinstance(value, dict):
+            if is_identity(value):
+                value["id"] += offset if value["id"] > 0 else -offset
+            for item in value.values():
+                shift(item)
+
+    shift(data)
+    return data
+
+
+def wait_until_handled(router, timeout):
+    """Wait until the router has no unacknowledged updates"""
+    deadline = time.monotonic() + timeout
+    while router.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return router.pending() == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-process update throughput")
+    parser.add_argument("recordings", nargs="+", help="traffic-*.jsonl.gz files")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts")
+    parser.add_argument("--copies", type=int, default=20, help="copies of the recorded updates")
+    parser.add_argument("--tmdb-latency", type=float, default=50, help="simulated TMDb latency in ms")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for each run")
+    args = parser.parse_args()
+
+    records = load_records(args.recordings)
+    responses = {
+        response_key(record["path"], record["params"]): record
+        for record in records if record["type"] == "tmdb"
+    }
+    recorded = [record["update"] for record in records if record["type"] == "update"]
+    stub = StubServer(responses, args.tmdb_latency / 1000)
+
+    # Worker processes read their settings from the environment when they start
+    directory = tempfile.mkdtemp(prefix="tmdb-bench-")
+    os.environ.update({
+        "TELEGRAM_API_BASE_URL": f"{stub.url}/bot/",
+        "TMDB_API_BASE_URL": f"{stub.url}/tmdb",
+        "TMDB_IMAGE_BASE_URL": f"{stub.url}/img",
+        "CACHE_BACKEND": "sqlite",
+        "RATE_LIMIT_USER_BURST": "1000000",
+        "RATE_LIMIT_CHAT_BURST": "1000000",
+    })
+
+    # Imported after the environment is prepared, like a fresh bot process
+    from telegram import Update
+    from cluster import ClusterRouter
+
+    updates = []
+    for copy_index in range(args.copies):
+        for data in recorded:
+            data = with_offset(data, copy_index * 1_000_000_000)
+            data["update_id"] = len(updates) + 1
+            updates.append(data)
+
+    print(f"{len(updates)} updates, {len(responses)} recorded TMDb responses, "
+          f"TMDb latency {args.tmdb_latency:.0f}ms")
+    baseline = None
+    for workers in [int(count) for count in args.workers.split(",")]:
+        os.environ["BOT_WORKERS"] = str(workers)
+        os.environ["CACHE_DB_PATH"] = os.path.join(directory, f"cache-{workers}.sqlite3")
+        router = ClusterRouter(REPLAY_TOKEN, workers)
+        router.start()
+        try:
+            # One /start per worker, so process start-up is not measured
+            for index in range(workers):
+                router.route(Update.de_json({
+                    "update_id": -1 - index,
+                    "message": {
+                        "message_id": 1, "date": int(time.time()), "text": "/start",
+                        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                        "chat": {"id": index, "type": "private"},
+                        "from": {"id": index, "is_bot": False, "first_name": "User"},
+                    },
+                }, router.bot))
+            wait_until_handled(router, args.timeout)
+
+            counts_before = dict(stub.counts)
+            started = time.monotonic()
+            for data in updates:
+                router.route(Update.de_json(data, router.bot))
+            handled = wait_until_handled(router, args.timeout)
+            elapsed = time.monotonic() - started
+        finally:
+            router.stop()
+
+        throughput = len(updates) / elapsed
+        baseline = baseline or throughput
+        status = "" if handled else " (timed out)"
+        calls = {name: count - counts_before.get(name, 0) for name, count in stub.counts.items()}
+        telegram_calls = sum(count for name, count in calls.items() if name.startswith("telegram."))
+        print(f"{workers} worker(s): {elapsed:.2f}s, {throughput:.1f} updates/s, "
+              f"{throughput / baseline:.2f}x, {telegram_calls} Telegram and {calls.get('tmdb', 0)} TMDb calls{status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,32 @@
+import functools
+import io
 import logging
+import os
+import re
+import threading
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, Filters
-from config import TELEGRAM_BOT_TOKEN
+from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, Filters, TypeHandler
+from config import (
+    TELEGRAM_BOT_TOKEN, BOT_WORKERS, CONTACT_SHEET_MAX_IMAGES,
+    ARTWORK_DEDUP, ARTWORK_DEDUP_THRESHOLD, ARTWORK_HASH_DB_PATH,
+    RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST, RATE_LIMIT_CHAT_RATE, RATE_LIMIT_CHAT_BURST,
+    RATE_LIMIT_MAX_KEYS, RATE_LIMIT_IDLE_TTL,
+    TELEGRAM_API_BASE_URL, RECORD_TRAFFIC_DIR, RECORD_TRAFFIC_SALT, RECORD_TRAFFIC_ROTATE_SECONDS,
+    ADMIN_USER_IDS, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS, PROFILE_INTERVAL, MEMSNAP_MAX_SECONDS,
+    STATS_TOP_TITLES, BATCH_MAX_TITLES, BATCH_EDIT_INTERVAL
+)
 from tmdb_api import TMDbAPI
+from contact_sheet import ContactSheetService
+from artwork_dedup import create_deduplicator
+from zip_export import ZipExporter
+from batch_lookup import BatchLookup, parse_titles
+from rate_limit import KeyedRateLimiter, admit
+from scheduler import scheduler, BULK, INTERACTIVE, current_job_class
+from traffic_recorder import create_recorder
+from tracing import traced, current_span, TracingBot, TracingRequest
+from profiling import SamplingProfiler, MemoryProfiler
+from metrics import metrics
 
 # Enable logging
 logging.basicConfig(
@@ -10,8 +34,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize TMDb API
-tmdb = TMDbAPI()
+# Processes started with spawn (cluster workers, image pools) first load this
+# script again as __mp_main__, and with several workers the main script only
+# routes updates. Only the copy imported as a module, or the main script
+# handling updates itself, builds the TMDb client, caches and services, so no
+# process holds an unused set.
+if __name__ == 'bot' or (__name__ == '__main__' and BOT_WORKERS <= 1):
+    # Initialize TMDb API
+    tmdb = TMDbAPI()
+
+    # Initialize opt-in traffic recording (None when disabled)
+    traffic_recorder = create_recorder(RECORD_TRAFFIC_DIR, RECORD_TRAFFIC_SALT, RECORD_TRAFFIC_ROTATE_SECONDS)
+    tmdb.recorder = traffic_recorder
+
+    # Initialize contact sheet generation
+    contact_sheets = ContactSheetService(tmdb)
+
+    # Initialize near-duplicate artwork collapsing (None when disabled)
+    artwork_dedup = create_deduplicator(tmdb, ARTWORK_DEDUP, ARTWORK_DEDUP_THRESHOLD, ARTWORK_HASH_DB_PATH)
+
+    # Initialize ZIP export of all artwork
+    zip_exporter = ZipExporter(tmdb)
+
+    # Initialize per-user and per-chat admission control; the shared lock lets
+    # an update take from both buckets at once
+    admission_lock = threading.Lock()
+    user_limiter = KeyedRateLimiter(
+        "user", RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_IDLE_TTL, admission_lock
+    )
+    chat_limiter = KeyedRateLimiter(
+        "chat", RATE_LIMIT_CHAT_RATE, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_IDLE_TTL, admission_lock
+    )
+
+    # Initialize on-demand profilers for admins
+    profiler = SamplingProfiler()
+    memory_profiler = MemoryProfiler(MEMSNAP_MAX_SECONDS)
+
+def admin_only(handler):
+    """Ignore a command unless it comes from a user listed in ADMIN_USER_IDS."""
+    @functools.wraps(handler)
+    def wrapper(update: Update, context: CallbackContext) -> None:
+        user = update.effective_user
+        if not user or user.id not in ADMIN_USER_IDS:
+            logger.warning(f"Ignored admin command from user {user.id if user else 'unknown'}")
+            return
+        handler(update, context)
+    return wrapper
+
+def is_admitted(update: Update) -> bool:
+    """Check the user and chat of an update against their rate limits."""
+    limits = []
+    if update.effective_user:
+        limits.append((user_limiter, update.effective_user.id))
+    if update.effective_chat:
+        limits.append((chat_limiter, update.effective_chat.id))
+    # A rejected update costs neither a token
+    return admit(limits)
+
+def get_listed_images(details, image_type):
+    """Get the posters or backdrops to list, collapsing near-duplicates if enabled."""
+    images = details.get('images', {}).get(image_type, [])
+    if artwork_dedup is None or image_type not in ['posters', 'backdrops']:
+        return images
+    try:
+        # Handlers on the dispatcher thread never wait for thumbnails to be hashed
+        return artwork_dedup.collapse(image_type, images, wait=current_job_class() != INTERACTIVE)
+    except Exception as e:
+        logger.error(f"Error collapsing duplicate {image_type}: {e}")
+        return images
 
 def start(update: Update, context: CallbackContext) -> None:
     """Send a welcome message when the command /start is issued."""
@@ -24,12 +114,19 @@ def start(update: Update, context: CallbackContext) -> None:
     )
     update.message.reply_text(welcome_message)
 
+@metrics.timed("handler.tmdb")
+@traced("command.tmdb")
 def tmdb_search(update: Update, context: CallbackContext) -> None:
     """Handle the /tmdb command to search for movies and TV shows."""
     if not context.args:
         update.message.reply_text("Please provide a movie or TV show name. Example: /tmdb Inception")
         return
     
+    # Drop searches from users or chats over their rate limit
+    if not is_admitted(update):
+        logger.info(f"Dropped search in chat {update.effective_chat.id}: rate limited")
+        return
+    
     query = ' '.join(context.args)
     update.message.reply_text(f"🔍 Searching for '{query}'...")
     
@@ -65,6 +162,64 @@ def tmdb_search(update: Update, context: CallbackContext) -> None:
     reply_markup = InlineKeyboardMarkup(keyboard)
     update.message.reply_text(f"Found {len(media_results)} results for '{query}':", reply_markup=reply_markup)
 
+def format_batch_results(titles, results, done):
+    """Build the progress text and, once done, the details keyboard of a batch lookup."""
+    lines = []
+    keyboard = []
+    for title, item in zip(titles, results):
+        if item is False:
+            lines.append(f"⏳ {title}")
+        elif item is None:
+            lines.append(f"❌ {title}: not found")
+        else:
+            name = item.get('title', item.get('name', 'Unknown'))
+            date = item.get('release_date') or item.get('first_air_date') or ''
+            year = f" ({date[:4]})" if date else ""
+            media_type = "🎬" if item['media_type'] == 'movie' else "📺"
+            lines.append(f"{media_type} {title} → {name}{year}")
+            keyboard.append([InlineKeyboardButton(
+                f"{media_type} {name}{year}",
+                callback_data=f"details_{item['media_type']}_{item['id']}_en-US"
+            )])
+    
+    found = len(keyboard)
+    resolved = sum(1 for item in results if item is not False)
+    header = (
+        f"✅ Found {found} of {len(titles)} titles:" if done
+        else f"🔍 Looking up {len(titles)} titles ({resolved} done)..."
+    )
+    # Telegram messages are limited to 4096 characters
+    text = "\n".join([header, ""] + lines)[:4000]
+    reply_markup = InlineKeyboardMarkup(keyboard) if done and keyboard else None
+    return text, reply_markup
+
+def batch_command(update: Update, context: CallbackContext) -> None:
+    """Handle /batch with one title per line: look them all up concurrently."""
+    titles, skipped = parse_titles(update.message.text or "", BATCH_MAX_TITLES)
+    if not titles:
+        update.message.reply_text(
+            "Please send one title per line after the command. Example:\n/batch\nInception\nThe Matrix"
+        )
+        return
+    
+    # Drop batches from users or chats over their rate limit
+    if not is_admitted(update):
+        logger.info(f"Dropped batch in chat {update.effective_chat.id}: rate limited")
+        return
+    
+    if skipped:
+        update.message.reply_text(f"Only the first {BATCH_MAX_TITLES} titles will be looked up; {skipped} skipped.")
+    
+    text, _ = format_batch_results(titles, [False] * len(titles), False)
+    status = update.message.reply_text(text)
+    
+    def publish(results, done):
+        text, reply_markup = format_batch_results(titles, results, done)
+        status.edit_text(text, reply_markup=reply_markup)
+    
+    # Searches run as bulk jobs; progress is published from the scheduler threads
+    BatchLookup(tmdb, titles, publish, BATCH_EDIT_INTERVAL).start()
+
 def handle_details(update: Update, context: CallbackContext) -> None:
     """Handle button press to show media details."""
     query = update.callback_query
@@ -86,6 +241,7 @@ def handle_details(update: Update, context: CallbackContext) -> None:
     
     # Get title and basic info
     title = details.get('title', details.get('name', 'Unknown'))
+    metrics.offer("titles", f"{media_type}/{media_id}", title)
     
     # Create message with media information
     if media_type == 'movie':
@@ -121,7 +277,7 @@ def handle_details(update: Update, context: CallbackContext) -> None:
     current_lang_name = "English" if language == "en-US" else language
     
     # Poster button (if available) - Portrait (High-Res by default)
-    posters = details.get('images', {}).get('posters', [])
+    posters = get_listed_images(details, 'posters')
     if details.get('poster_path'):
         poster_url = tmdb.get_poster_url(details['poster_path'], 'original')  # High-Res by default
         keyboard.append([
@@ -144,7 +300,7 @@ def handle_details(update: Update, context: CallbackContext) -> None:
         ])
     
     # Backdrop button (if available) - Landscape (High-Res by default)
-    backdrops = details.get('images', {}).get('backdrops', [])
+    backdrops = get_listed_images(details, 'backdrops')
     if details.get('backdrop_path'):
         backdrop_url = tmdb.get_backdrop_url(details['backdrop_path'], 'original')  # High-Res by default
         keyboard.append([
@@ -185,6 +341,12 @@ def handle_details(update: Update, context: CallbackContext) -> None:
             InlineKeyboardButton(f"🎥 View All {len(all_logos)} Logos", callback_data=f"logos_{media_type}_{media_id}_{language}")
         ])
         
+    # Season Artwork button (TV shows only)
+    if media_type == 'tv' and get_season_numbers(details):
+        keyboard.append([
+            InlineKeyboardButton("📺 Season Artwork", callback_data=f"seasons_{media_id}_{language}")
+        ])
+    
     # Send All Images button
     keyboard.append([
         InlineKeyboardButton("📦 Send All Images", callback_data=f"send_all_{media_type}_{media_id}_{language}")
@@ -279,14 +441,14 @@ def handle_send_all_images(update: Update, context: CallbackContext) -> None:
     keyboard = []
     
     # Add view all posters button if there are multiple posters
-    posters = details.get('images', {}).get('posters', [])
+    posters = get_listed_images(details, 'posters')
     if len(posters) > 1:
         keyboard.append([
             InlineKeyboardButton(f"🖼️ View All {len(posters)} Posters", callback_data=f"posters_{media_type}_{media_id}_{language}")
         ])
     
     # Add view all backdrops button if there are multiple backdrops
-    backdrops = details.get('images', {}).get('backdrops', [])
+    backdrops = get_listed_images(details, 'backdrops')
     if len(backdrops) > 1:
         keyboard.append([
             InlineKeyboardButton(f"🌆 View All {len(backdrops)} Backdrops", callback_data=f"backdrops_{media_type}_{media_id}_{language}")
@@ -299,6 +461,11 @@ def handle_send_all_images(update: Update, context: CallbackContext) -> None:
             InlineKeyboardButton(f"🎥 View All {len(logos)} Logos", callback_data=f"logos_{media_type}_{media_id}_{language}")
         ])
     
+    # Download everything as a ZIP file
+    keyboard.append([
+        InlineKeyboardButton("🗜️ Download All as ZIP", callback_data=f"zip_{media_type}_{media_id}_{language}")
+    ])
+    
     # Back button
     keyboard.append([
         InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_{media_type}_{media_id}_{language}")
@@ -344,7 +511,7 @@ def handle_backdrops(update: Update, context: CallbackContext) -> None:
     title = details.get('title', details.get('name', 'Unknown'))
     
     # Get all backdrops
-    backdrops = details.get('images', {}).get('backdrops', [])
+    backdrops = get_listed_images(details, 'backdrops')
     if not backdrops:
         query.edit_message_text(f"No backdrops found for {title}.")
         return
@@ -430,7 +597,7 @@ def handle_lang_backdrops(update: Update, context: CallbackContext) -> None:
     title = details.get('title', details.get('name', 'Unknown'))
     
     # Get all backdrops for the selected language
-    all_backdrops = details.get('images', {}).get('backdrops', [])
+    all_backdrops = get_listed_images(details, 'backdrops')
     if backdrop_lang_code == 'null':
         backdrops = [b for b in all_backdrops if not b.get('iso_639_1')]
         lang_name = "No Language"
@@ -485,6 +652,9 @@ def handle_lang_backdrops(update: Update, context: CallbackContext) -> None:
     if nav_buttons:
         keyboard.append(nav_buttons)
     
+    # Contact sheet button
+    keyboard.append([InlineKeyboardButton("🗂️ Contact Sheet", callback_data=f"sheet_backdrops_{media_type}_{media_id}_{base_language}_{backdrop_lang_code}")])
+    
     # Back buttons
     keyboard.append([InlineKeyboardButton("🔙 Back to All Backdrops", callback_data=f"backdrops_{media_type}_{media_id}_{base_language}")])
     keyboard.append([InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_{media_type}_{media_id}_{base_language}")])
@@ -531,7 +701,7 @@ def handle_posters(update: Update, context: CallbackContext) -> None:
     title = details.get('title', details.get('name', 'Unknown'))
     
     # Get all posters
-    posters = details.get('images', {}).get('posters', [])
+    posters = get_listed_images(details, 'posters')
     if not posters:
         query.edit_message_text(f"No posters found for {title}.")
         return
@@ -613,7 +783,7 @@ def handle_lang_posters(update: Update, context: CallbackContext) -> None:
     title = details.get('title', details.get('name', 'Unknown'))
     
     # Get all posters for the selected language
-    all_posters = details.get('images', {}).get('posters', [])
+    all_posters = get_listed_images(details, 'posters')
     if poster_lang_code == 'null':
         posters = [p for p in all_posters if not p.get('iso_639_1')]
         lang_name = "No Language"
@@ -668,6 +838,9 @@ def handle_lang_posters(update: Update, context: CallbackContext) -> None:
     if nav_buttons:
         keyboard.append(nav_buttons)
     
+    # Contact sheet button
+    keyboard.append([InlineKeyboardButton("🗂️ Contact Sheet", callback_data=f"sheet_posters_{media_type}_{media_id}_{base_language}_{poster_lang_code}")])
+    
     # Back buttons
     keyboard.append([InlineKeyboardButton("🔙 Back to All Posters", callback_data=f"posters_{media_type}_{media_id}_{base_language}")])
     keyboard.append([InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_{media_type}_{media_id}_{base_language}")])
@@ -851,6 +1024,9 @@ def handle_lang_logos(update: Update, context: CallbackContext) -> None:
     if nav_buttons:
         keyboard.append(nav_buttons)
     
+    # Contact sheet button
+    keyboard.append([InlineKeyboardButton("🗂️ Contact Sheet", callback_data=f"sheet_logos_{media_type}_{media_id}_{base_language}_{logo_lang_code}")])
+    
     # Back buttons
     keyboard.append([InlineKeyboardButton("🔙 Back to All Logos", callback_data=f"logos_{media_type}_{media_id}_{base_language}")])
     keyboard.append([InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_{media_type}_{media_id}_{base_language}")])
@@ -874,10 +1050,381 @@ def handle_lang_logos(update: Update, context: CallbackContext) -> None:
             ]])
         )
 
+def get_season_numbers(details):
+    """Get the season numbers of a TV show, including specials (season 0) if listed."""
+    seasons = details.get('seasons')
+    if seasons:
+        return [season['season_number'] for season in seasons if 'season_number' in season]
+    # Details cached before seasons were kept only have the count
+    return list(range(1, (details.get('number_of_seasons') or 0) + 1))
+
+def season_label(season_number):
+    """Name a season for buttons and headers."""
+    return "Specials" if season_number == 0 else f"Season {season_number}"
+
+def handle_seasons(update: Update, context: CallbackContext) -> None:
+    """Handle the season artwork button: list every season of a TV show."""
+    query = update.callback_query
+    query.answer("Loading seasons...")
+    
+    # Parse callback data
+    data_parts = query.data.split('_')
+    if len(data_parts) < 3 or data_parts[0] != 'seasons':
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    _, tv_id, language = data_parts
+    
+    details = tmdb.get_details('tv', tv_id, language)
+    if not details:
+        query.edit_message_text("Failed to fetch details. Please try again.")
+        return
+    
+    title = details.get('name', 'Unknown')
+    season_numbers = get_season_numbers(details)
+    if not season_numbers:
+        query.edit_message_text(f"No seasons found for {title}.")
+        return
+    
+    # Fetch all seasons at once; each is cached for the season views below
+    seasons = tmdb.get_seasons(tv_id, season_numbers, language)
+    
+    message = f"📺 *{title}* - Season Artwork\n\n"
+    buttons = []
+    for season_number in season_numbers:
+        season = seasons.get(season_number)
+        label = season_label(season_number)
+        if not season:
+            message += f"• {label}: unavailable\n"
+            continue
+        posters = len(season.get('images', {}).get('posters', []))
+        stills = sum(1 for episode in season.get('episodes', []) if episode.get('still_path'))
+        year = f" ({season['air_date'][:4]})" if season.get('air_date') else ""
+        message += f"• {label}{year}: {posters} posters, {stills} episode stills\n"
+        buttons.append(InlineKeyboardButton(label, callback_data=f"season_{tv_id}_{season_number}_{language}"))
+    
+    # Three seasons per row keeps long-running shows on one screen
+    keyboard = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    keyboard.append([InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_tv_{tv_id}_{language}")])
+    
+    try:
+        query.edit_message_text(
+            text=message[:4000],
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Error showing seasons: {e}")
+        query.edit_message_text(
+            text="Failed to show seasons. Please try again.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Back to Details", callback_data=f"details_tv_{tv_id}_{language}")
+            ]])
+        )
+
+def handle_season(update: Update, context: CallbackContext) -> None:
+    """Handle selecting a season: show its poster and links to its posters and episode stills."""
+    query = update.callback_query
+    query.answer()
+    
+    # Parse callback data
+    data_parts = query.data.split('_')
+    if len(data_parts) < 4 or data_parts[0] != 'season':
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    _, tv_id, season_number, language = data_parts
+    season_number = int(season_number)
+    
+    season = tmdb.get_season(tv_id, season_number, language)
+    if not season:
+        query.edit_message_text("Failed to fetch season. Please try again.")
+        return
+    
+    label = season_label(season_number)
+    name = season.get('name') or label
+    episodes = season.get('episodes', [])
+    posters = season.get('images', {}).get('posters', [])
+    stills = [episode for episode in episodes if episode.get('still_path')]
+    
+    message = (
+        f"📺 *{name}*\n\n"
+        f"📅 Air Date: {season.get('air_date') or 'Unknown'}\n"
+        f"📚 Episodes: {len(episodes)}\n"
+        f"🖼️ Posters: {len(posters)}\n"
+        f"🎞️ Episode Stills: {len(stills)}"
+    )
+    
+    keyboard = []
+    if season.get('poster_path'):
+        poster_url = tmdb.get_poster_url(season['poster_path'], 'original')  # High-Res by default
+        keyboard.append([InlineKeyboardButton(f"🖼️ {label} Poster", url=poster_url)])
+    if posters:
+        keyboard.append([InlineKeyboardButton(
+            f"🖼️ View All {len(posters)} Posters",
+            callback_data=f"seasonposters_{tv_id}_{season_number}_{language}_1"
+        )])
+    if stills:
+        keyboard.append([InlineKeyboardButton(
+            f"🎞️ View {len(stills)} Episode Stills",
+            callback_data=f"stills_{tv_id}_{season_number}_{language}_1"
+        )])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Seasons", callback_data=f"seasons_{tv_id}_{language}")])
+    
+    try:
+        query.edit_message_text(
+            text=message,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Error showing season: {e}")
+        query.edit_message_text(
+            text=message,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+def handle_season_images(update: Update, context: CallbackContext) -> None:
+    """Handle showing the posters or episode stills of a season with pagination."""
+    query = update.callback_query
+    
+    # Parse callback data
+    data_parts = query.data.split('_')
+    if len(data_parts) < 5 or data_parts[0] not in ['seasonposters', 'stills']:
+        query.answer()
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    view, tv_id, season_number, language, page = data_parts
+    season_number = int(season_number)
+    page = int(page)
+    query.answer("Loading posters..." if view == 'seasonposters' else "Loading stills...")
+    
+    season = tmdb.get_season(tv_id, season_number, language)
+    if not season:
+        query.edit_message_text("Failed to fetch season. Please try again.")
+        return
+    
+    name = season.get('name') or season_label(season_number)
+    
+    # Build (caption, url) pairs for the selected view
+    if view == 'seasonposters':
+        heading = "Posters"
+        images = []
+        for i, poster in enumerate(season.get('images', {}).get('posters', [])):
+            lang_code = poster.get('iso_639_1')
+            lang_name = "No Language" if not lang_code else ("English" if lang_code == "en" else lang_code)
+            images.append((f"Poster {i + 1} ({lang_name})", tmdb.get_poster_url(poster['file_path'], 'original')))
+    else:
+        heading = "Episode Stills"
+        images = [
+            (f"E{episode.get('episode_number', '?')} - {episode.get('name', 'Unknown')}",
+             tmdb.get_still_url(episode['still_path'], 'original'))
+            for episode in season.get('episodes', []) if episode.get('still_path')
+        ]
+    
+    if not images:
+        query.edit_message_text(f"No {heading.lower()} found for {name}.")
+        return
+    
+    # Pagination settings
+    images_per_page = 5
+    total_pages = (len(images) + images_per_page - 1) // images_per_page  # Ceiling division
+    
+    # Ensure page is within valid range
+    if page < 1:
+        page = 1
+    elif page > total_pages:
+        page = total_pages
+    
+    # Get images for current page
+    start_idx = (page - 1) * images_per_page
+    end_idx = min(start_idx + images_per_page, len(images))
+    
+    # Create message with image links for current page
+    message = f"📺 *{name}* - {heading} (Page {page}/{total_pages})\n\n"
+    for caption, url in images[start_idx:end_idx]:
+        message += f"*{caption}*:\n{url}\n\n"
+    
+    # Create navigation buttons
+    keyboard = []
+    
+    # Add pagination buttons
+    nav_buttons = []
+    if page > 1:
+        nav_buttons.append(InlineKeyboardButton(
+            "⬅️ Previous",
+            callback_data=f"{view}_{tv_id}_{season_number}_{language}_{page-1}"
+        ))
+    
+    if page < total_pages:
+        nav_buttons.append(InlineKeyboardButton(
+            "Next ➡️",
+            callback_data=f"{view}_{tv_id}_{season_number}_{language}_{page+1}"
+        ))
+    
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    # Back buttons
+    keyboard.append([InlineKeyboardButton(f"🔙 Back to {season_label(season_number)}", callback_data=f"season_{tv_id}_{season_number}_{language}")])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Seasons", callback_data=f"seasons_{tv_id}_{language}")])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    # Send message with image links
+    try:
+        query.edit_message_text(
+            text=message,
+            reply_markup=reply_markup,
+            parse_mode='Markdown',
+            disable_web_page_preview=True  # Disable preview to avoid showing just one image
+        )
+    except Exception as e:
+        logger.error(f"Error showing season {heading.lower()}: {e}")
+        # Episode names may break Markdown, so retry as plain text
+        query.edit_message_text(
+            text=message.replace('*', ''),
+            reply_markup=reply_markup,
+            disable_web_page_preview=True
+        )
+
+def handle_contact_sheet(update: Update, context: CallbackContext) -> None:
+    """Handle sending a contact sheet of all images of one type and language."""
+    query = update.callback_query
+    
+    # Parse callback data
+    data_parts = query.data.split('_')
+    if len(data_parts) < 6 or data_parts[0] != 'sheet':
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    _, image_type, media_type, media_id, base_language, lang_code = data_parts
+    if image_type not in ['posters', 'backdrops', 'logos']:
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    # Get detailed information
+    details = tmdb.get_details(media_type, media_id, base_language)
+    if not details:
+        query.message.reply_text("Failed to fetch details. Please try again.")
+        return
+    
+    # Get title
+    title = details.get('title', details.get('name', 'Unknown'))
+    
+    # Get all images of this type for the selected language
+    all_images = get_listed_images(details, image_type)
+    if lang_code == 'null':
+        images = [i for i in all_images if not i.get('iso_639_1')]
+        lang_name = "No Language"
+    else:
+        images = [i for i in all_images if i.get('iso_639_1') == lang_code]
+        lang_name = "English" if lang_code == "en" else lang_code
+    
+    if not images:
+        query.message.reply_text(f"No {image_type} found for {title} in {lang_name}.")
+        return
+    
+    # Build the contact sheets (cached after the first request)
+    try:
+        sheets = contact_sheets.get_sheets(
+            f"{media_type}_{media_id}", image_type, lang_code, [i['file_path'] for i in images]
+        )
+    except Exception as e:
+        logger.error(f"Error generating contact sheet: {e}")
+        query.message.reply_text("Failed to generate contact sheet. Please try again.")
+        return
+    
+    # Send one photo per sheet, numbered like the paginated links
+    per_sheet = CONTACT_SHEET_MAX_IMAGES
+    for index, sheet in enumerate(sheets):
+        first = index * per_sheet + 1
+        last = min(first + per_sheet - 1, len(images))
+        query.message.reply_photo(
+            photo=sheet,
+            caption=f"{title} - {lang_name} {image_type.capitalize()} {first}-{last} of {len(images)}"
+        )
+
+def handle_zip_export(update: Update, context: CallbackContext) -> None:
+    """Handle exporting every poster, backdrop and logo of a title as ZIP files."""
+    query = update.callback_query
+    
+    # Parse callback data
+    data_parts = query.data.split('_')
+    if len(data_parts) < 4 or data_parts[0] != 'zip':
+        query.edit_message_text("Invalid selection. Please try again.")
+        return
+    
+    _, media_type, media_id, language = data_parts
+    
+    # Get detailed information
+    details = tmdb.get_details(media_type, media_id, language)
+    if not details:
+        query.message.reply_text("Failed to fetch details. Please try again.")
+        return
+    
+    # Get title
+    title = details.get('title', details.get('name', 'Unknown'))
+    
+    # Collect every image in original size, named by type, number and language
+    url_builders = {
+        'posters': tmdb.get_poster_url,
+        'backdrops': tmdb.get_backdrop_url,
+        'logos': tmdb.get_logo_url
+    }
+    images = []
+    for image_type, get_url in url_builders.items():
+        for i, image in enumerate(details.get('images', {}).get(image_type, [])):
+            lang_code = image.get('iso_639_1') or 'null'
+            extension = os.path.splitext(image['file_path'])[1]
+            images.append((f"{image_type}/{i + 1:03d}_{lang_code}{extension}", get_url(image['file_path'], 'original')))
+    
+    if not images:
+        query.message.reply_text(f"No images found for {title}.")
+        return
+    
+    status = query.message.reply_text(f"📦 Packing {len(images)} images for {title}...")
+    
+    # Build (or join an identical running) export and upload its parts
+    base_name = re.sub(r'[^A-Za-z0-9]+', '_', title).strip('_') or f"{media_type}_{media_id}"
+    export_key = (media_type, media_id, tuple(url for _, url in images))
+    try:
+        with zip_exporter.export(export_key, base_name, images) as parts:
+            if not parts:
+                status.edit_text(f"Failed to download images for {title}. Please try again.")
+                return
+            
+            for i, path in enumerate(parts):
+                caption = f"{title} - All Images"
+                if len(parts) > 1:
+                    caption += f" (Part {i + 1}/{len(parts)})"
+                with open(path, 'rb') as document:
+                    query.message.reply_document(
+                        document=document,
+                        filename=os.path.basename(path),
+                        caption=caption,
+                        timeout=300
+                    )
+    except Exception as e:
+        logger.error(f"Error exporting images as ZIP: {e}")
+        status.edit_text("Failed to prepare the ZIP file. Please try again.")
+        return
+    
+    status.edit_text(f"✅ Sent {len(images)} images for {title}.")
+
+@metrics.timed("handler.callback_query")
+@traced("callback_query")
 def handle_callback_query(update: Update, context: CallbackContext) -> None:
     """Route callback queries to appropriate handlers."""
     query = update.callback_query
     data = query.data
+    current_span().set_attribute("bot.action", data.split('_')[0])
+    
+    # Answer over-limit button presses without doing any work
+    if not is_admitted(update):
+        query.answer("⏳ Too many requests. Please slow down.")
+        return
     
     if data.startswith('details_'):
         handle_details(update, context)
@@ -895,6 +1442,20 @@ def handle_callback_query(update: Update, context: CallbackContext) -> None:
         handle_lang_posters(update, context)
     elif data.startswith('lang_logos_'):
         handle_lang_logos(update, context)
+    elif data.startswith('seasons_'):
+        handle_seasons(update, context)
+    elif data.startswith('season_'):
+        handle_season(update, context)
+    elif data.startswith('seasonposters_') or data.startswith('stills_'):
+        handle_season_images(update, context)
+    elif data.startswith('sheet_'):
+        # Long-running bulk work runs off the dispatcher thread; the query is
+        # answered first, as Telegram rejects answers once a query is too old
+        query.answer("Generating contact sheet...")
+        scheduler.submit(BULK, handle_contact_sheet, update, context)
+    elif data.startswith('zip_'):
+        query.answer("Preparing ZIP file...")
+        scheduler.submit(BULK, handle_zip_export, update, context)
     elif data == 'back_to_search':
         handle_back_to_search(update, context)
     elif data == 'no_action':
@@ -902,22 +1463,157 @@ def handle_callback_query(update: Update, context: CallbackContext) -> None:
     else:
         query.answer("Unknown action")
 
-def main() -> None:
-    """Start the bot."""
-    # Create the Updater and pass it your bot's token
-    updater = Updater(TELEGRAM_BOT_TOKEN)
+@admin_only
+def profile_command(update: Update, context: CallbackContext) -> None:
+    """Handle /profile [seconds]: sample all threads and send a collapsed-stack flame file."""
+    seconds = PROFILE_DEFAULT_SECONDS
+    if context.args and context.args[0].isdigit():
+        seconds = max(1, min(int(context.args[0]), PROFILE_MAX_SECONDS))
+    
+    chat_id = update.effective_chat.id
+    update.message.reply_text(f"⏱️ Profiling all threads for {seconds}s...")
+    
+    def run_profile():
+        result = profiler.profile(seconds, PROFILE_INTERVAL)
+        if result is None:
+            context.bot.send_message(chat_id, "A profile is already running. Please try again later.")
+            return
+        
+        collapsed, samples = result
+        context.bot.send_document(
+            chat_id,
+            document=io.BytesIO(collapsed.encode('utf-8')),
+            filename=f"profile-{os.getpid()}-{int(time.time())}.folded",
+            caption=f"{samples} samples over {seconds}s (collapsed stacks for flamegraph.pl or speedscope)"
+        )
+    
+    # Profile from a separate thread so the dispatcher threads being sampled keep running
+    threading.Thread(target=run_profile, name="profiler", daemon=True).start()
 
-    # Get the dispatcher to register handlers
-    dispatcher = updater.dispatcher
+@admin_only
+def memsnap_command(update: Update, context: CallbackContext) -> None:
+    """Handle /memsnap [stop]: report top allocation sites and growth since the last snapshot."""
+    if context.args and context.args[0] == 'stop':
+        memory_profiler.stop()
+        update.message.reply_text("Stopped tracing allocations.")
+        return
+    
+    report = memory_profiler.snapshot()
+    # Telegram messages are limited to 4096 characters
+    update.message.reply_text(report[:4000])
+
+def format_latency(name, window):
+    """Format the p50/p95 of a windowed latency for /stats."""
+    count, (p50, p95) = metrics.latency_percentiles(name, window)
+    if not count:
+        return "none recorded"
+    return f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms ({count} calls)"
+
+@admin_only
+def stats_command(update: Update, context: CallbackContext) -> None:
+    """Handle /stats: report cache, latency, upstream and queue statistics of this process."""
+    counters = metrics.snapshot()
+    hits = counters.get('tmdb.cache.hit', 0) + counters.get('tmdb.cache.stale_served', 0)
+    lookups = hits + counters.get('tmdb.cache.miss', 0)
+    hit_rate = f"{hits / lookups:.0%}" if lookups else "n/a"
+    
+    lines = [
+        f"📊 Stats for process {os.getpid()}",
+        "",
+        "Cache:",
+        f"• Entries: {len(tmdb.cache)} / {tmdb.cache.max_entries}",
+        f"• Hit rate: {hit_rate} ({hits} of {lookups} lookups, {counters.get('tmdb.cache.stale_served', 0)} stale)",
+        f"• Evictions: {tmdb.cache.evictions}, revalidated: {counters.get('tmdb.cache.revalidated', 0)}, "
+        f"stale on error: {counters.get('tmdb.cache.stale_on_error', 0)}",
+        "",
+        "Handler latency:",
+    ]
+    for name in ('handler.tmdb', 'handler.callback_query'):
+        for label, window in (('1m', 60), ('5m', 300)):
+            lines.append(f"• {name[len('handler.'):]} {label}: {format_latency(name, window)}")
+    
+    lines.extend(["", "TMDb:"])
+    for label, window in (('1m', 60), ('5m', 300)):
+        requests_count = metrics.rate('tmdb.upstream.requests', window)
+        errors = metrics.rate('tmdb.upstream.errors', window)
+        error_rate = f"{errors / requests_count:.1%}" if requests_count else "n/a"
+        lines.append(f"• {label}: {requests_count / window:.2f} req/s, error rate {error_rate}, "
+                     f"{format_latency('tmdb.upstream', window)}")
+    breakers = ", ".join(f"{family} {state}" for family, state in sorted(tmdb.breaker_states().items()))
+    lines.append(f"• Circuits: {breakers or 'none used yet'}")
+    
+    lines.extend([
+        "",
+        "Queues:",
+        f"• Telegram requests in flight: {counters.get('telegram.requests_in_flight', 0)}",
+    ])
+    # Workers are handed updates one at a time, so only the polling dispatcher has a backlog
+    if BOT_WORKERS <= 1:
+        lines.append(f"• Pending updates: {context.dispatcher.update_queue.qsize()}")
+    for name, (jobs, waiters) in scheduler.queue_depths().items():
+        lines.append(f"• {name}: {jobs} jobs queued, {waiters} waiting for TMDb")
+    
+    lines.extend(["", "Scheduler waits (5m):"])
+    for name in scheduler.queue_depths():
+        lines.append(f"• {name} queue: {format_latency(f'scheduler.{name}.queue_wait', 300)}")
+        lines.append(f"• {name} TMDb slot: {format_latency(f'scheduler.{name}.upstream_wait', 300)}")
+    
+    lines.extend(["", "Most rate limited:"])
+    for limiter in (user_limiter, chat_limiter):
+        top_limited = limiter.top_limited(5)
+        keys = ", ".join(f"{key} ({count})" for key, count in top_limited)
+        lines.append(f"• {limiter.name}s: {keys or 'none'}")
+    
+    lines.extend(["", "Top titles:"])
+    top_titles = metrics.top("titles", STATS_TOP_TITLES)
+    for key, title, count, error in top_titles:
+        # Counts are upper bounds; error is how much they may overestimate
+        estimate = f"{count}" if not error else f"{count - error}-{count}"
+        lines.append(f"• {title} ({key}): {estimate}")
+    if not top_titles:
+        lines.append("• None yet")
+    
+    update.message.reply_text("\n".join(lines)[:4000])
 
+def record_update(update: Update, context: CallbackContext) -> None:
+    """Record every incoming update before it is handled."""
+    traffic_recorder.record_update(update)
+
+def register_handlers(dispatcher) -> None:
+    """Register all command and callback handlers on a dispatcher."""
+    # Record updates in an earlier group so normal handling is unaffected
+    if traffic_recorder is not None:
+        dispatcher.add_handler(TypeHandler(Update, record_update), group=-1)
+    
     # Register command handlers
     dispatcher.add_handler(CommandHandler("start", start))
     dispatcher.add_handler(CommandHandler("tmdb", tmdb_search))
     # Also register the alternative command as mentioned in requirements
     dispatcher.add_handler(CommandHandler("trndb", tmdb_search))
+    dispatcher.add_handler(CommandHandler("batch", batch_command))
+    
+    # Register admin commands
+    dispatcher.add_handler(CommandHandler("profile", profile_command))
+    dispatcher.add_handler(CommandHandler("memsnap", memsnap_command))
+    dispatcher.add_handler(CommandHandler("stats", stats_command))
     
     # Register callback query handler
     dispatcher.add_handler(CallbackQueryHandler(handle_callback_query))
+
+def main() -> None:
+    """Start the bot."""
+    # With several workers, a front process routes updates to worker processes
+    if BOT_WORKERS > 1:
+        from cluster import ClusterRouter
+        ClusterRouter(TELEGRAM_BOT_TOKEN, BOT_WORKERS).run()
+        return
+
+    # Create the Updater with a bot whose polled updates and Telegram calls are traced
+    bot = TracingBot(TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_BASE_URL or None, request=TracingRequest(con_pool_size=8))
+    updater = Updater(bot=bot)
+
+    # Get the dispatcher to register handlers
+    register_handlers(updater.dispatcher)
     
     # Start the Bot
     updater.start_polling()
@@ -0,0 +1,197 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import metrics
+import json_codec
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Freshness states of a cache entry
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+# Seconds between updates of an entry's last access time in the SQLite cache;
+# eviction order only needs to be approximate, and reads then rarely write
+ACCESS_UPDATE_INTERVAL = 60
+
+
+class CacheEntry:
+    """A cached value together with the time it was fetched.
+
+    ``etag`` and ``last_modified`` hold the upstream validators used for
+    conditional revalidation, and ``size`` the length of the response body.
+    """
+
+    __slots__ = ("value", "fetched_at", "etag", "last_modified", "size")
+
+    def __init__(self, value, fetched_at, etag=None, last_modified=None, size=0):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+
+
+class ResponseCache:
+    """Bounded LRU cache with soft and hard expiry.
+
+    Entries younger than ``soft_ttl`` are fresh, entries between ``soft_ttl``
+    and ``hard_ttl`` are stale and entries older than ``hard_ttl`` are expired.
+    Expired entries are kept until evicted so they can still be served when
+    the upstream fails.
+    """
+
+    def __init__(self, max_entries, soft_ttl, hard_ttl):
+        self.max_entries = max_entries
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the entry stored under key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, etag=None, last_modified=None, size=0):
+        """Store a freshly fetched value"""
+        with self._lock:
+            self._entries[key] = CacheEntry(value, time.time(), etag, last_modified, size)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, key):
+        """Mark an entry as fresh again after successful revalidation"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.fetched_at = time.time()
+                self._entries.move_to_end(key)
+            return entry
+
+    def freshness(self, entry):
+        """Classify an entry as fresh, stale or expired"""
+        age = time.time() - entry.fetched_at
+        if age < self.soft_ttl:
+            return FRESH
+        if age < self.hard_ttl:
+            return STALE
+        return EXPIRED
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteResponseCache(ResponseCache):
+    """ResponseCache stored in a local SQLite database.
+
+    The database can be shared by several worker processes on the same host.
+    Values must be JSON serializable. Database errors, such as a lock held
+    too long by another process, are logged and treated as cache misses.
+    """
+
+    def __init__(self, path, max_entries, soft_ttl, hard_ttl):
+        super().__init__(max_entries, soft_ttl, hard_ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB, fetched_at REAL, accessed_at REAL, "
+                "etag TEXT, last_modified TEXT, size INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connection(self):
+        """Return the SQLite connection of the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _database_error(self, action, error):
+        """Log and count a failed database operation"""
+        metrics.increment("tmdb.cache.db_errors")
+        logger.warning(f"Error {action} SQLite cache: {error}")
+
+    def get(self, key):
+        """Return the entry stored under key, or None"""
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, fetched_at, accessed_at, etag, last_modified, size FROM responses WHERE key = ?",
+                (repr(key),)
+            ).fetchone()
+            if row is None:
+                return None
+            value, fetched_at, accessed_at, etag, last_modified, size = row
+            now = time.time()
+            if now - accessed_at >= ACCESS_UPDATE_INTERVAL:
+                with conn:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, repr(key)))
+        except sqlite3.Error as e:
+            self._database_error("reading", e)
+            return None
+        return CacheEntry(json_codec.loads(value), fetched_at, etag, last_modified, size)
+
+    def set(self, key, value, etag=None, last_modified=None, size=0):
+        """Store a freshly fetched value"""
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (repr(key), json_codec.dumps(value), now, now, etag, last_modified, size)
+                )
+                evicted = conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        except sqlite3.Error as e:
+            self._database_error("writing", e)
+            return
+        # Only counts evictions made by this process
+        self.evictions += max(evicted, 0)
+
+    def touch(self, key):
+        """Mark an entry as fresh again after successful revalidation"""
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                    (now, now, repr(key))
+                )
+        except sqlite3.Error as e:
+            self._database_error("updating", e)
+            return None
+        return self.get(key)
+
+    def __len__(self):
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error as e:
+            self._database_error("counting", e)
+            return 0
+
+
+def create_cache(backend, path, max_entries, soft_ttl, hard_ttl):
+    """Create the response cache for the configured backend"""
+    if backend == "sqlite":
+        return SqliteResponseCache(path, max_entries, soft_ttl, hard_ttl)
+    return ResponseCache(max_entries, soft_ttl, hard_ttl)
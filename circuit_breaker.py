@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from metrics import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Circuit breaker for one family of upstream endpoints.
+
+    The circuit opens after ``failure_threshold`` consecutive failures, where
+    calls slower than ``slow_call_threshold`` seconds also count as failures.
+    While open, requests are rejected immediately. After ``open_timeout``
+    seconds up to ``half_open_max_calls`` probe requests are let through; a
+    successful probe closes the circuit and a failed one opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, slow_call_threshold, open_timeout, half_open_max_calls):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a request may be sent upstream"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_timeout:
+                    metrics.increment(f"tmdb.breaker.{self.name}.rejected")
+                    return False
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    metrics.increment(f"tmdb.breaker.{self.name}.rejected")
+                    return False
+                self._probes += 1
+
+            return True
+
+    def record_success(self, elapsed):
+        """Record a completed request and how long it took"""
+        if elapsed > self.slow_call_threshold:
+            self.record_failure()
+            return
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._transition(CLOSED)
+            self._failures = 0
+
+    def record_failure(self):
+        """Record a failed or slow request"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._transition(OPEN)
+                return
+
+            self._failures += 1
+            if self.state == CLOSED and self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        """Move to a new state; must be called with the lock held"""
+        if state == self.state:
+            return
+
+        logger.warning(f"Circuit '{self.name}' changed from {self.state} to {state}")
+        metrics.increment(f"tmdb.breaker.{self.name}.{state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == CLOSED:
+            self._failures = 0
+            self._probes = 0
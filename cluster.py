@@ -0,0 +1,181 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from telegram import Bot, Update
+from telegram.error import NetworkError, TelegramError
+from telegram.ext import Dispatcher
+from config import CLUSTER_POLL_TIMEOUT, CLUSTER_MAX_DELIVERY_ATTEMPTS, TELEGRAM_API_BASE_URL
+from tracing import TracingRequest, mark_received
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(index, token, inbox, acks):
+    """Process updates routed to one worker process"""
+    # Imported here so each worker builds its own TMDb client and cache connection
+    import bot
+
+    # Shutdown is coordinated by the front process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    telegram_bot = Bot(token, base_url=TELEGRAM_API_BASE_URL or None, request=TracingRequest(con_pool_size=4))
+    # Updates are handled on this thread, one at a time, so no async worker threads are needed
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Asynchronous callbacks can not be processed")
+        dispatcher = Dispatcher(telegram_bot, queue.Queue(), workers=0)
+    bot.register_handlers(dispatcher)
+    logger.info(f"Worker {index} started")
+
+    while True:
+        item = inbox.get()
+        if item is None:
+            break
+
+        data, received_at = item
+        update = Update.de_json(data, telegram_bot)
+        mark_received(update.update_id, received_at)
+        try:
+            dispatcher.process_update(update)
+        finally:
+            acks.put((index, update.update_id))
+
+
+class ClusterRouter:
+    """Front process that routes updates to worker processes by chat.
+
+    Updates from the same chat always go to the same worker, so they are
+    handled in order. Each worker acknowledges an update once it has been
+    handled; if a worker dies, it is restarted and its unacknowledged updates
+    are delivered again.
+    """
+
+    def __init__(self, token, workers):
+        self.token = token
+        self.worker_count = workers
+        self.bot = Bot(token, base_url=TELEGRAM_API_BASE_URL or None)
+        self._context = multiprocessing.get_context("spawn")
+        self._acks = self._context.Queue()
+        self._workers = [None] * workers
+        self._inboxes = [None] * workers
+        self._pending = [OrderedDict() for _ in range(workers)]
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._supervisor = None
+
+    def _start_worker(self, index):
+        """Start (or restart) a worker process and redeliver its pending updates"""
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.token, inbox, self._acks),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._workers[index] = process
+        self._inboxes[index] = inbox
+
+        for update_id, item in list(self._pending[index].items()):
+            attempts = self._attempts.get(update_id, 0) + 1
+            if attempts > CLUSTER_MAX_DELIVERY_ATTEMPTS:
+                logger.error(f"Dropping update {update_id} after {attempts - 1} failed deliveries")
+                del self._pending[index][update_id]
+                self._attempts.pop(update_id, None)
+                continue
+            self._attempts[update_id] = attempts
+            inbox.put(item)
+
+    def route(self, update, received_at=None):
+        """Send an update to the worker that owns its chat, with the time it was received"""
+        if update.effective_chat:
+            key = update.effective_chat.id
+        elif update.effective_user:
+            key = update.effective_user.id
+        else:
+            key = update.update_id
+        index = abs(key) % self.worker_count
+
+        item = (update.to_dict(), received_at or time.time())
+        with self._lock:
+            self._pending[index][update.update_id] = item
+            self._attempts[update.update_id] = 1
+            self._inboxes[index].put(item)
+
+    def _supervise(self):
+        """Collect acknowledgements and restart crashed workers"""
+        while self._running.is_set():
+            try:
+                index, update_id = self._acks.get(timeout=1)
+                with self._lock:
+                    self._pending[index].pop(update_id, None)
+                    self._attempts.pop(update_id, None)
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                for index, process in enumerate(self._workers):
+                    if self._running.is_set() and not process.is_alive():
+                        logger.error(
+                            f"Worker {index} exited with code {process.exitcode}, "
+                            f"restarting with {len(self._pending[index])} pending updates"
+                        )
+                        self._start_worker(index)
+
+    def pending(self):
+        """Return the number of routed updates not yet acknowledged"""
+        with self._lock:
+            return sum(len(pending) for pending in self._pending)
+
+    def start(self):
+        """Start the worker processes and their supervisor"""
+        self._running.set()
+        with self._lock:
+            for index in range(self.worker_count):
+                self._start_worker(index)
+        self._supervisor = threading.Thread(target=self._supervise, name="cluster-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info(f"Routing updates to {self.worker_count} worker processes")
+
+    def stop(self):
+        """Stop the supervisor and let the workers finish their queued updates"""
+        self._running.clear()
+        self._supervisor.join()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._workers:
+            process.join(timeout=10)
+
+    def run(self):
+        """Poll Telegram for updates and route them until interrupted"""
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.start()
+
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = self.bot.get_updates(offset=offset, timeout=CLUSTER_POLL_TIMEOUT)
+                except NetworkError as e:
+                    logger.warning(f"Error polling for updates: {e}")
+                    time.sleep(1)
+                    continue
+                except TelegramError as e:
+                    logger.error(f"Error polling for updates: {e}")
+                    time.sleep(5)
+                    continue
+
+                received_at = time.time()
+                for update in updates:
+                    self.route(update, received_at)
+                    offset = update.update_id + 1
+        except KeyboardInterrupt:
+            logger.info("Stopping workers")
+        finally:
+            self.stop()
@@ -11,8 +11,10 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 
 # TMDb API Base URLs
-TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
-TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+TMDB_API_BASE_URL = os.getenv("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
+TMDB_IMAGE_BASE_URL = os.getenv("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p")
+# Bot API server, e.g. a local telegram-bot-api server (empty for api.telegram.org)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "")
 
 # Image sizes
 POSTER_SIZES = {
@@ -36,3 +38,120 @@ LOGO_SIZES = {
     "original": "original"
 }
 
+STILL_SIZES = {
+    "small": "w92",
+    "medium": "w185",
+    "large": "w300",
+    "original": "original"
+}
+
+
+# Response cache settings (TTLs in seconds)
+# Within the soft TTL cached responses are served as fresh, between the soft
+# and hard TTL they are served while being refreshed in the background, and
+# past the hard TTL they are only served when TMDb fails.
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL", "600"))
+CACHE_HARD_TTL = int(os.getenv("CACHE_HARD_TTL", "86400"))
+
+# Number of worker processes; with more than one, a front process receives
+# updates and routes them to the workers by chat
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+
+# Cache backend: "memory" for a per-process cache, "sqlite" for a cache shared
+# by all worker processes on the host
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite" if BOT_WORKERS > 1 else "memory")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "tmdb_cache.sqlite3")
+
+# Seconds the front process long-polls Telegram for updates
+CLUSTER_POLL_TIMEOUT = int(os.getenv("CLUSTER_POLL_TIMEOUT", "10"))
+# Times an update is redelivered after its worker crashed before it is dropped
+CLUSTER_MAX_DELIVERY_ATTEMPTS = int(os.getenv("CLUSTER_MAX_DELIVERY_ATTEMPTS", "3"))
+
+# TMDb request timeout in seconds
+TMDB_REQUEST_TIMEOUT = float(os.getenv("TMDB_REQUEST_TIMEOUT", "10"))
+
+# Circuit breaker settings, applied separately to each TMDb endpoint family
+# The circuit opens after this many consecutive failed or slow requests
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Requests slower than this many seconds count as failures
+BREAKER_SLOW_CALL_THRESHOLD = float(os.getenv("BREAKER_SLOW_CALL_THRESHOLD", "5"))
+# Seconds to fail fast before letting probe requests through
+BREAKER_OPEN_TIMEOUT = float(os.getenv("BREAKER_OPEN_TIMEOUT", "30"))
+# Number of concurrent probe requests allowed while half-open
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+# Contact sheets: process pool size, images per sheet and number of cached sheets
+CONTACT_SHEET_WORKERS = int(os.getenv("CONTACT_SHEET_WORKERS", "2"))
+CONTACT_SHEET_MAX_IMAGES = int(os.getenv("CONTACT_SHEET_MAX_IMAGES", "30"))
+CONTACT_SHEET_COLUMNS = int(os.getenv("CONTACT_SHEET_COLUMNS", "6"))
+CONTACT_SHEET_CACHE_ENTRIES = int(os.getenv("CONTACT_SHEET_CACHE_ENTRIES", "100"))
+CONTACT_SHEET_CACHE_TTL = int(os.getenv("CONTACT_SHEET_CACHE_TTL", "86400"))
+
+# Near-duplicate artwork collapsing (requires numpy)
+ARTWORK_DEDUP = os.getenv("ARTWORK_DEDUP", "false").lower() == "true"
+# Maximum Hamming distance between 64-bit perceptual hashes of duplicates
+ARTWORK_DEDUP_THRESHOLD = int(os.getenv("ARTWORK_DEDUP_THRESHOLD", "6"))
+ARTWORK_HASH_DB_PATH = os.getenv("ARTWORK_HASH_DB_PATH", "artwork_hashes.sqlite3")
+
+# ZIP export of all artwork for a title
+# Maximum concurrent image downloads per export
+ZIP_EXPORT_DOWNLOADS = int(os.getenv("ZIP_EXPORT_DOWNLOADS", "4"))
+# Maximum size of one ZIP part in bytes (Telegram bots can upload up to 50 MB)
+ZIP_EXPORT_PART_SIZE = int(os.getenv("ZIP_EXPORT_PART_SIZE", str(49 * 1024 * 1024)))
+# Optional directory where downloaded original images are kept for reuse
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "")
+
+# Admission control: token buckets per user and per chat
+# Sustained requests per second and burst size for a single user
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "1"))
+RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+# Sustained requests per second and burst size for a single chat
+RATE_LIMIT_CHAT_RATE = float(os.getenv("RATE_LIMIT_CHAT_RATE", "3"))
+RATE_LIMIT_CHAT_BURST = int(os.getenv("RATE_LIMIT_CHAT_BURST", "15"))
+# Number of users/chats tracked and seconds an idle bucket is kept
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+RATE_LIMIT_IDLE_TTL = int(os.getenv("RATE_LIMIT_IDLE_TTL", "600"))
+
+# Priority scheduling of bulk and background work
+# Threads running bulk and background jobs (contact sheets, ZIP exports, cache refreshes)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+# Maximum concurrent requests to the TMDb API across all job classes
+TMDB_MAX_CONCURRENT_REQUESTS = int(os.getenv("TMDB_MAX_CONCURRENT_REQUESTS", "8"))
+# Relative share of queued work given to each job class
+SCHEDULER_WEIGHTS = {
+    "interactive": int(os.getenv("SCHEDULER_WEIGHT_INTERACTIVE", "16")),
+    "bulk": int(os.getenv("SCHEDULER_WEIGHT_BULK", "4")),
+    "background": int(os.getenv("SCHEDULER_WEIGHT_BACKGROUND", "1")),
+}
+
+# Traffic recording for offline replay (disabled when empty)
+RECORD_TRAFFIC_DIR = os.getenv("RECORD_TRAFFIC_DIR", "")
+# Secret mixed into anonymized user and chat ids; keep it stable to link recordings
+RECORD_TRAFFIC_SALT = os.getenv("RECORD_TRAFFIC_SALT", "")
+# Seconds after which a new recording file is started
+RECORD_TRAFFIC_ROTATE_SECONDS = int(os.getenv("RECORD_TRAFFIC_ROTATE_SECONDS", "3600"))
+
+# Per-update tracing; 0 disables it, 1 traces every update
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Spans are written as OTLP JSON lines to a rotating file per process, named with its pid
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+
+# Telegram user ids allowed to use admin commands (comma separated)
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# Sampling profiler: default and maximum duration in seconds, and sampling interval
+PROFILE_DEFAULT_SECONDS = int(os.getenv("PROFILE_DEFAULT_SECONDS", "10"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Seconds after which memory allocation tracing started by /memsnap stops by itself
+MEMSNAP_MAX_SECONDS = int(os.getenv("MEMSNAP_MAX_SECONDS", "600"))
+
+# Number of most requested titles listed by /stats
+STATS_TOP_TITLES = int(os.getenv("STATS_TOP_TITLES", "10"))
+
+# Batch lookups: maximum titles per /batch message and seconds between progress edits
+BATCH_MAX_TITLES = int(os.getenv("BATCH_MAX_TITLES", "50"))
+BATCH_EDIT_INTERVAL = float(os.getenv("BATCH_EDIT_INTERVAL", "1.5"))
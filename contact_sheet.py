@@ -0,0 +1,127 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import requests
+from PIL import Image, ImageDraw
+from cache import ResponseCache, EXPIRED
+from config import (
+    CONTACT_SHEET_WORKERS, CONTACT_SHEET_MAX_IMAGES, CONTACT_SHEET_COLUMNS,
+    CONTACT_SHEET_CACHE_ENTRIES, CONTACT_SHEET_CACHE_TTL, TMDB_REQUEST_TIMEOUT
+)
+from metrics import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Thumbnail size requested from TMDb and tile size on the sheet for each image type
+SHEET_LAYOUTS = {
+    "posters": ("w154", (154, 231)),
+    "backdrops": ("w300", (300, 169)),
+    "logos": ("w300", (300, 150)),
+}
+
+BACKGROUND_COLOR = (30, 30, 30)
+LABEL_COLOR = (255, 255, 255)
+TILE_PADDING = 6
+
+
+def compose_sheet(thumbnails, first_number, columns, tile_size):
+    """Compose thumbnails into a numbered grid and return it as JPEG bytes.
+
+    Runs in a worker process, so it only takes and returns picklable values.
+    Thumbnails that are None or cannot be decoded are left as empty tiles.
+    """
+    tile_width, tile_height = tile_size
+    rows = (len(thumbnails) + columns - 1) // columns
+    cell_width = tile_width + TILE_PADDING * 2
+    cell_height = tile_height + TILE_PADDING * 2
+    sheet = Image.new("RGB", (cell_width * min(columns, len(thumbnails)), cell_height * rows), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(sheet)
+
+    for index, data in enumerate(thumbnails):
+        left = (index % columns) * cell_width + TILE_PADDING
+        top = (index // columns) * cell_height + TILE_PADDING
+
+        if data:
+            try:
+                with Image.open(io.BytesIO(data)) as image:
+                    image = image.convert("RGBA")
+                    image.thumbnail(tile_size)
+                    offset = (left + (tile_width - image.width) // 2, top + (tile_height - image.height) // 2)
+                    sheet.paste(image, offset, image)
+            except OSError:
+                pass
+
+        draw.text((left + 4, top + 2), str(first_number + index), fill=LABEL_COLOR)
+
+    output = io.BytesIO()
+    sheet.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+class ContactSheetService:
+    """Builds contact sheets of TMDb artwork on a bounded process pool.
+
+    Finished sheets are cached by title, image type, language and a hash of
+    the image set, so repeated requests for the same artwork are free.
+    """
+
+    def __init__(self, tmdb):
+        self.tmdb = tmdb
+        self.cache = ResponseCache(CONTACT_SHEET_CACHE_ENTRIES, CONTACT_SHEET_CACHE_TTL, CONTACT_SHEET_CACHE_TTL)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._downloads = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sheet-download")
+
+    def _get_pool(self):
+        """Create the process pool on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=CONTACT_SHEET_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _download(self, url):
+        """Download one thumbnail, returning None on failure"""
+        try:
+            response = self.tmdb.session.get(url, timeout=TMDB_REQUEST_TIMEOUT)
+            return response.content if response.status_code == 200 else None
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Error downloading thumbnail {url}: {e}")
+            return None
+
+    def get_sheets(self, title_key, kind, language, file_paths):
+        """Return the JPEG contact sheets for a list of image file paths"""
+        image_set_hash = hashlib.sha1("\n".join(file_paths).encode("utf-8")).hexdigest()
+        key = (title_key, kind, language, image_set_hash)
+
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.freshness(entry) != EXPIRED:
+            metrics.increment("contact_sheet.cache.hit")
+            return entry.value
+        metrics.increment("contact_sheet.cache.miss")
+
+        size, tile_size = SHEET_LAYOUTS[kind]
+        urls = [f"{self.tmdb.image_base_url}/{size}{file_path}" for file_path in file_paths]
+        thumbnails = list(self._downloads.map(self._download, urls))
+
+        pool = self._get_pool()
+        futures = [
+            pool.submit(
+                compose_sheet,
+                thumbnails[start:start + CONTACT_SHEET_MAX_IMAGES],
+                start + 1,
+                CONTACT_SHEET_COLUMNS,
+                tile_size
+            )
+            for start in range(0, len(thumbnails), CONTACT_SHEET_MAX_IMAGES)
+        ]
+        sheets = [future.result() for future in futures]
+
+        self.cache.set(key, sheets)
+        return sheets
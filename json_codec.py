@@ -0,0 +1,23 @@
+import json
+
+# orjson is optional; it decodes large TMDb payloads several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DECODER = "orjson" if orjson is not None else "json"
+
+
+def loads(data):
+    """Decode a JSON document from bytes using the fastest available decoder"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    """Encode a value as JSON bytes using the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,224 @@
+import functools
+import math
+import threading
+import time
+from collections import defaultdict
+
+# Length of the sliding windows kept for latencies and rates, in seconds
+WINDOW_SECONDS = 300
+
+# Latency histogram buckets grow by this factor from 1 ms, covering up to ~30 minutes
+LATENCY_BUCKET_FACTOR = 1.25
+LATENCY_BUCKET_BASE = 0.001
+LATENCY_BUCKETS = 64
+
+
+class WindowedHistogram:
+    """Latency histogram over a sliding window of one-second slots.
+
+    Recording is O(1): the value's log-scale bucket is incremented in the
+    slot for the current second, and slots are cleared as they are reused.
+    Percentiles are estimated from bucket upper bounds when read.
+    """
+
+    def __init__(self):
+        self._slots = [[0] * LATENCY_BUCKETS for _ in range(WINDOW_SECONDS)]
+        self._slot_seconds = [-1] * WINDOW_SECONDS
+
+    def _slot(self, second):
+        index = second % WINDOW_SECONDS
+        if self._slot_seconds[index] != second:
+            self._slots[index] = [0] * LATENCY_BUCKETS
+            self._slot_seconds[index] = second
+        return self._slots[index]
+
+    def record(self, seconds, now):
+        if seconds <= LATENCY_BUCKET_BASE:
+            bucket = 0
+        else:
+            bucket = min(LATENCY_BUCKETS - 1, int(math.log(seconds / LATENCY_BUCKET_BASE, LATENCY_BUCKET_FACTOR)) + 1)
+        self._slot(int(now))[bucket] += 1
+
+    def percentiles(self, fractions, window, now):
+        """Return (count, [estimated percentile in seconds, ...]) over the last window seconds"""
+        totals = [0] * LATENCY_BUCKETS
+        current = int(now)
+        for second in range(current - min(window, WINDOW_SECONDS) + 1, current + 1):
+            index = second % WINDOW_SECONDS
+            if self._slot_seconds[index] == second:
+                for bucket, count in enumerate(self._slots[index]):
+                    totals[bucket] += count
+
+        count = sum(totals)
+        results = []
+        for fraction in fractions:
+            rank = fraction * count
+            seen = 0
+            for bucket, bucket_count in enumerate(totals):
+                seen += bucket_count
+                if count and seen >= rank:
+                    results.append(LATENCY_BUCKET_BASE * LATENCY_BUCKET_FACTOR ** bucket)
+                    break
+            else:
+                results.append(0.0)
+        return count, results
+
+
+class WindowedCounter:
+    """Event counter over a sliding window of one-second slots"""
+
+    def __init__(self):
+        self._counts = [0] * WINDOW_SECONDS
+        self._slot_seconds = [-1] * WINDOW_SECONDS
+
+    def add(self, value, now):
+        second = int(now)
+        index = second % WINDOW_SECONDS
+        if self._slot_seconds[index] != second:
+            self._counts[index] = 0
+            self._slot_seconds[index] = second
+        self._counts[index] += value
+
+    def total(self, window, now):
+        """Return the number of events in the last window seconds"""
+        current = int(now)
+        return sum(
+            self._counts[second % WINDOW_SECONDS]
+            for second in range(current - min(window, WINDOW_SECONDS) + 1, current + 1)
+            if self._slot_seconds[second % WINDOW_SECONDS] == second
+        )
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch tracking at most ``capacity`` keys.
+
+    Keys are grouped by count so that each offer is O(1): a tracked key
+    moves to the next count group, and an untracked key replaces a key
+    with the minimum count, inheriting that count as its error bound.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._counts = {}
+        self._errors = {}
+        self._labels = {}
+        self._groups = defaultdict(set)
+        self._min_count = 0
+
+    def offer(self, key, label=None):
+        if key in self._counts:
+            count = self._counts[key]
+        elif len(self._counts) < self.capacity:
+            count = 0
+            self._errors[key] = 0
+            self._min_count = 0
+        else:
+            # Evict a key with the minimum count and take over its count
+            count = self._min_count
+            evicted = self._groups[count].pop()
+            del self._counts[evicted]
+            del self._errors[evicted]
+            self._labels.pop(evicted, None)
+            self._errors[key] = count
+
+        if count:
+            self._groups[count].discard(key)
+            if not self._groups[count]:
+                del self._groups[count]
+                if self._min_count == count:
+                    self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._groups[count + 1].add(key)
+        if count == 0:
+            self._min_count = 1
+        if label is not None:
+            self._labels[key] = label
+
+    def top(self, n):
+        """Return [(key, label, count, error)] for the n most frequent keys"""
+        keys = sorted(self._counts, key=self._counts.get, reverse=True)[:n]
+        return [(key, self._labels.get(key), self._counts[key], self._errors[key]) for key in keys]
+
+
+class Metrics:
+    """Thread-safe in-process counters and latencies shared by the bot and the TMDb client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._latencies = defaultdict(WindowedHistogram)
+        self._rates = defaultdict(WindowedCounter)
+        self._top = {}
+
+    def increment(self, name, value=1):
+        """Increase a named counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def record_latency(self, name, seconds):
+        """Record a latency in the sliding-window histogram for name"""
+        now = time.time()
+        with self._lock:
+            self._latencies[name].record(seconds, now)
+
+    def latency_percentiles(self, name, window, fractions=(0.5, 0.95)):
+        """Return (count, [percentiles in seconds]) of a latency over the last window seconds"""
+        now = time.time()
+        with self._lock:
+            histogram = self._latencies.get(name)
+            if histogram is None:
+                return 0, [0.0] * len(fractions)
+            return histogram.percentiles(fractions, window, now)
+
+    def mark(self, name, value=1):
+        """Count events for a sliding-window rate"""
+        now = time.time()
+        with self._lock:
+            self._rates[name].add(value, now)
+
+    def rate(self, name, window):
+        """Return the number of marked events in the last window seconds"""
+        now = time.time()
+        with self._lock:
+            counter = self._rates.get(name)
+            return counter.total(window, now) if counter is not None else 0
+
+    def offer(self, name, key, label=None, capacity=100):
+        """Count an occurrence of key in the heavy-hitters sketch for name"""
+        with self._lock:
+            sketch = self._top.get(name)
+            if sketch is None:
+                sketch = self._top[name] = SpaceSaving(capacity)
+            sketch.offer(key, label)
+
+    def top(self, name, n=10):
+        """Return the n most frequent keys offered under name"""
+        with self._lock:
+            sketch = self._top.get(name)
+            return sketch.top(n) if sketch else []
+
+    def timed(self, name):
+        """Decorator recording each call's duration as a windowed latency"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.monotonic()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record_latency(name, time.monotonic() - started)
+            return wrapper
+        return decorator
+
+    def get(self, name):
+        """Return the current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Return a copy of all counters"""
+        with self._lock:
+            return dict(self._counters)
+
+# Shared metrics registry
+metrics = Metrics()
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Frames kept per allocation traceback while tracemalloc is tracing
+TRACEMALLOC_FRAMES = 10
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads and reports them as collapsed stacks.
+
+    Nothing runs between profiles. The output has one line per distinct
+    stack, ``thread;outer;...;inner count``, the input format of flame graph
+    tools such as flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, duration, interval):
+        """Sample every thread for duration seconds; return (collapsed stacks, sample count).
+
+        Returns None if a profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            stacks = Counter()
+            samples = 0
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    calls = []
+                    while frame is not None:
+                        code = frame.f_code
+                        calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    calls.append(names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(calls))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._lock.release()
+
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        return collapsed, samples
+
+
+class MemoryProfiler:
+    """Takes tracemalloc snapshots and reports the top allocation sites.
+
+    tracemalloc only runs between the first snapshot and ``stop``, so there
+    is no overhead until it is requested. It stops by itself ``max_seconds``
+    after it was started, in case ``stop`` is never called.
+    """
+
+    def __init__(self, max_seconds):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._previous = None
+        self._timer = None
+
+    @staticmethod
+    def _take_snapshot():
+        """Take a snapshot without tracemalloc's own allocations"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot(self, limit=10):
+        """Take a snapshot and return a report of top sites and growth since the last one"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._previous = self._take_snapshot()
+                self._timer = threading.Timer(self.max_seconds, self.stop)
+                self._timer.daemon = True
+                self._timer.start()
+                return (
+                    "Started tracing allocations. Run the command again to see the top allocation sites. "
+                    f"Tracing stops by itself after {self.max_seconds}s."
+                )
+
+            snapshot = self._take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"Traced memory: {current / 1024 / 1024:.1f} MiB (peak {peak / 1024 / 1024:.1f} MiB)", ""]
+
+            lines.append("Top allocation sites:")
+            for stat in snapshot.statistics("lineno")[:limit]:
+                lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks: {stat.traceback[0]}")
+
+            lines.append("")
+            lines.append("Largest changes since the previous snapshot:")
+            for stat in snapshot.compare_to(self._previous, "lineno")[:limit]:
+                lines.append(f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks): {stat.traceback[0]}")
+
+            self._previous = snapshot
+            return "\n".join(lines)
+
+    def stop(self):
+        """Stop tracing allocations and drop the stored snapshot"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            tracemalloc.stop()
+            self._previous = None
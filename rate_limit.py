@@ -0,0 +1,88 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from metrics import metrics
+
+
+class TokenBucket:
+    """Token bucket state for a single key"""
+
+    __slots__ = ("tokens", "updated", "limited")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+        self.limited = 0
+
+
+class KeyedRateLimiter:
+    """Token bucket rate limiter with one bucket per key (user or chat id).
+
+    Each bucket refills at ``rate`` tokens per second up to ``capacity``.
+    At most ``max_keys`` buckets are kept, least recently used first out, and
+    buckets idle for longer than ``idle_ttl`` seconds are dropped; a dropped
+    bucket would have refilled to capacity anyway. Limiters consulted
+    together by ``admit`` must be created with the same ``lock``.
+    """
+
+    def __init__(self, name, rate, capacity, max_keys, idle_ttl, lock=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._buckets = OrderedDict()
+        self._lock = lock or threading.Lock()
+
+    def _refill(self, key, now):
+        """Return the refilled bucket for key; must be called with the lock held"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, now)
+            self._buckets[key] = bucket
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+
+        self._evict(now)
+        return bucket
+
+    def _evict(self, now):
+        """Drop idle and excess buckets; must be called with the lock held"""
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - bucket.updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def top_limited(self, n=10):
+        """Return the n keys limited most often, with their counts"""
+        with self._lock:
+            limited = [(bucket.limited, key) for key, bucket in self._buckets.items() if bucket.limited]
+        return [(key, count) for count, key in heapq.nlargest(n, limited)]
+
+
+def admit(limits):
+    """Take a token for every (limiter, key) pair, or none if any key is over its limit.
+
+    All buckets are checked and taken from under the limiters' shared lock,
+    so concurrent requests cannot overdraw a bucket and a rejection costs
+    no token. The rejecting key is counted as limited.
+    """
+    if not limits:
+        return True
+    now = time.monotonic()
+    with limits[0][0]._lock:
+        buckets = [(limiter, limiter._refill(key, now)) for limiter, key in limits]
+        for limiter, bucket in buckets:
+            if bucket.tokens < 1:
+                bucket.limited += 1
+                break
+        else:
+            for _, bucket in buckets:
+                bucket.tokens -= 1
+            return True
+    metrics.increment(f"ratelimit.{limiter.name}.limited")
+    return False
@@ -0,0 +1,212 @@
+"""Replay recorded traffic against local stubs of Telegram and TMDb.
+
+Usage: python replay.py traffic-*.jsonl.gz [--speed N] [--workers N] [--tmdb-latency MS]
+
+Recorded updates are fed through the bot's handlers with their original
+timing (divided by --speed), spread over --workers sequential lanes by chat
+like the multi-process mode. TMDb requests are answered from the recorded
+responses and Telegram API calls by a stub that accepts everything. Cache
+sizes, rate limits and other settings are read from the environment as usual.
+"""
+import argparse
+import gzip
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+# Never record while replaying
+os.environ["RECORD_TRAFFIC_DIR"] = ""
+
+import json_codec
+
+REPLAY_TOKEN = "123456:replay"
+
+
+def load_records(paths):
+    """Read records from recording files, ordered by time"""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rb") as recording:
+            records.extend(json_codec.loads(line) for line in recording if line.strip())
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def response_key(path, params):
+    """Key identifying a TMDb request, independent of parameter order and types"""
+    return path, tuple(sorted((key, str(value)) for key, value in params.items() if key != "api_key"))
+
+
+def placeholder_image():
+    """Return a small JPEG served for every image request"""
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new("RGB", (92, 138), (90, 90, 90)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+class StubServer:
+    """Local HTTP server standing in for the TMDb API, TMDb images and the Telegram Bot API"""
+
+    def __init__(self, responses, tmdb_latency):
+        self.responses = responses
+        self.tmdb_latency = tmdb_latency
+        self.image = placeholder_image()
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._message_ids = iter(range(1, 1 << 62))
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.startswith("/img/"):
+                    stub.count("images")
+                    self._send(200, stub.image, "image/jpeg")
+                    return
+
+                stub.count("tmdb")
+                time.sleep(stub.tmdb_latency)
+                recorded = stub.responses.get(response_key(url.path[len("/tmdb"):], dict(parse_qsl(url.query))))
+                if recorded is None:
+                    stub.count("tmdb.unrecorded")
+                    self._send(404, b'{"success":false}')
+                elif recorded["body"] is None:
+                    self._send(recorded["status"], b'{"success":false}')
+                else:
+                    self._send(200, json_codec.dumps(recorded["body"]))
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                method = self.path.rsplit("/", 1)[-1]
+                stub.count(f"telegram.{method}")
+                self._send(200, json_codec.dumps({"ok": True, "result": stub.telegram_result(method)}))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def telegram_result(self, method):
+        """Return a plausible result for a Bot API method"""
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        if method.startswith(("send", "edit")):
+            with self._lock:
+                message_id = next(self._message_ids)
+            return {"message_id": message_id, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+        return True
+
+
+def percentile(values, fraction):
+    """Return the given percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded bot traffic against local stubs")
+    parser.add_argument("recordings", nargs="+", help="traffic-*.jsonl.gz files")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--workers", type=int, default=1, help="sequential lanes, as in BOT_WORKERS")
+    parser.add_argument("--tmdb-latency", type=float, default=50, help="simulated TMDb latency in ms")
+    args = parser.parse_args()
+
+    records = load_records(args.recordings)
+    responses = {
+        response_key(record["path"], record["params"]): record
+        for record in records if record["type"] == "tmdb"
+    }
+    updates = [record for record in records if record["type"] == "update"]
+    stub = StubServer(responses, args.tmdb_latency / 1000)
+
+    # Imported after the environment is prepared, like a fresh bot process
+    from telegram import Bot, Update
+    from telegram.ext import Dispatcher
+    from tracing import TracingRequest, mark_received
+    import bot
+    from metrics import metrics
+    from scheduler import scheduler
+
+    bot.tmdb.base_url = f"{stub.url}/tmdb"
+    bot.tmdb.image_base_url = f"{stub.url}/img"
+    telegram_bot = Bot(
+        REPLAY_TOKEN,
+        base_url=f"{stub.url}/bot",
+        request=TracingRequest(con_pool_size=args.workers + 4)
+    )
+    dispatcher = Dispatcher(telegram_bot, queue.Queue(), workers=1)
+    bot.register_handlers(dispatcher)
+
+    lanes = [ThreadPoolExecutor(max_workers=1) for _ in range(args.workers)]
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def handle(update, due):
+        dispatcher.process_update(update)
+        with latencies_lock:
+            latencies.append(time.monotonic() - due)
+
+    print(f"Replaying {len(updates)} updates with {len(responses)} recorded TMDb responses "
+          f"at {args.speed}x on {args.workers} lane(s)")
+    started = time.monotonic()
+    for record in updates:
+        due = started + record["t"] / args.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        update = Update.de_json(record["update"], telegram_bot)
+        chat = update.effective_chat or update.effective_user
+        lane = lanes[abs(chat.id if chat else update.update_id) % len(lanes)]
+        mark_received(update.update_id)
+        lane.submit(handle, update, due)
+
+    for lane in lanes:
+        lane.shutdown(wait=True)
+    elapsed = time.monotonic() - started
+
+    # Contact sheets, ZIP exports, batch lookups and refreshes run as scheduler jobs
+    scheduler.join()
+    drained = time.monotonic() - started
+
+    latencies.sort()
+    print(f"Handled {len(latencies)} updates in {elapsed:.1f}s ({len(latencies) / elapsed:.1f} updates/s), "
+          f"scheduled jobs finished after {drained:.1f}s")
+    print(f"Latency p50={percentile(latencies, 0.5) * 1000:.0f}ms "
+          f"p95={percentile(latencies, 0.95) * 1000:.0f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.0f}ms "
+          f"max={percentile(latencies, 1.0) * 1000:.0f}ms")
+    print("Stub calls:")
+    for name, count in sorted(stub.counts.items()):
+        print(f"  {name}: {count}")
+    print("Bot counters:")
+    for name, count in sorted(metrics.snapshot().items()):
+        print(f"  {name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from config import SCHEDULER_WORKERS, TMDB_MAX_CONCURRENT_REQUESTS, SCHEDULER_WEIGHTS
+from metrics import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Job classes, from most to least urgent
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BACKGROUND = "background"
+
+# Job class of the code currently running; handlers on dispatcher threads are interactive
+_current_job_class = contextvars.ContextVar("job_class", default=INTERACTIVE)
+
+
+def current_job_class():
+    """Return the job class of the current thread or job"""
+    return _current_job_class.get()
+
+
+@contextmanager
+def job_class(name):
+    """Run a block of code as the given job class"""
+    token = _current_job_class.set(name)
+    try:
+        yield
+    finally:
+        _current_job_class.reset(token)
+
+
+class WeightedFairQueue:
+    """Queue that serves job classes in proportion to their weights.
+
+    Each item gets a virtual finish time of ``max(virtual now, previous
+    finish of its class) + 1 / weight`` and items are served in finish
+    time order. A newly queued interactive item therefore goes ahead of
+    most queued bulk or background items, while those still make progress.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, weights):
+        self.weights = weights
+        self._heap = []
+        self._last_finish = {name: 0.0 for name in weights}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        self.depths = {name: 0 for name in weights}
+
+    def push(self, job_class, item):
+        """Queue an item for a job class"""
+        start = max(self._virtual_time, self._last_finish[job_class])
+        finish = start + 1.0 / self.weights[job_class]
+        self._last_finish[job_class] = finish
+        heapq.heappush(self._heap, (finish, next(self._sequence), job_class, item))
+        self.depths[job_class] += 1
+
+    def pop(self):
+        """Remove and return the next (job class, item)"""
+        finish, _, job_class, item = heapq.heappop(self._heap)
+        self._virtual_time = finish
+        self.depths[job_class] -= 1
+        return job_class, item
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class PriorityScheduler:
+    """Schedules bulk and background jobs and shares the TMDb request budget.
+
+    ``submit`` runs jobs on a small pool of threads in weighted fair order.
+    ``upstream_slot`` limits concurrent TMDb requests across all callers;
+    when all slots are busy, waiting callers are granted slots in weighted
+    fair order of their job class, so interactive requests overtake queued
+    bulk and background ones.
+    """
+
+    def __init__(self, workers, upstream_slots, weights):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._jobs = WeightedFairQueue(weights)
+        self._jobs_ready = threading.Condition(self._lock)
+        self._jobs_done = threading.Condition(self._lock)
+        self._running = 0
+        self._threads = []
+        self._free_slots = upstream_slots
+        self._slot_waiters = WeightedFairQueue(weights)
+
+    def submit(self, job_class, fn, *args, **kwargs):
+        """Queue fn to run as the given job class and return a Future"""
+        future = Future()
+        with self._lock:
+            if not self._threads:
+                self._start_workers()
+            # Jobs run in a copy of the submitter's context, so traces follow them
+            context = contextvars.copy_context()
+            self._jobs.push(job_class, (future, fn, args, kwargs, context, time.monotonic()))
+            self._jobs_ready.notify()
+        return future
+
+    def _start_workers(self):
+        """Start the worker threads; must be called with the lock held"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_jobs, name=f"scheduler-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run_jobs(self):
+        """Worker loop running queued jobs"""
+        while True:
+            with self._lock:
+                while not len(self._jobs):
+                    self._jobs_ready.wait()
+                name, (future, fn, args, kwargs, context, queued_at) = self._jobs.pop()
+                self._running += 1
+
+            metrics.record_latency(f"scheduler.{name}.queue_wait", time.monotonic() - queued_at)
+            try:
+                self._run_job(name, future, fn, args, kwargs, context)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if not self._running and not len(self._jobs):
+                        self._jobs_done.notify_all()
+
+    def _run_job(self, name, future, fn, args, kwargs, context):
+        """Run one job and resolve its future"""
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = context.run(self._call, name, fn, args, kwargs)
+        except Exception as e:
+            logger.error(f"Error in {name} job {getattr(fn, '__name__', fn)}: {e}")
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def _call(name, fn, args, kwargs):
+        """Run a job as its job class"""
+        with job_class(name):
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def upstream_slot(self):
+        """Hold one of the shared TMDb request slots for the current job class"""
+        name = current_job_class()
+        requested_at = time.monotonic()
+        granted = None
+        with self._lock:
+            if self._free_slots > 0 and not len(self._slot_waiters):
+                self._free_slots -= 1
+            else:
+                granted = threading.Event()
+                self._slot_waiters.push(name, granted)
+        if granted is not None:
+            granted.wait()
+        metrics.record_latency(f"scheduler.{name}.upstream_wait", time.monotonic() - requested_at)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                if len(self._slot_waiters):
+                    # Hand the slot straight to the next waiter
+                    _, waiter = self._slot_waiters.pop()
+                    waiter.set()
+                else:
+                    self._free_slots += 1
+
+    def join(self, timeout=None):
+        """Wait until no jobs are queued or running; return False on timeout.
+
+        Jobs submitted by running jobs, or by their done callbacks, are
+        waited for too.
+        """
+        with self._lock:
+            return self._jobs_done.wait_for(lambda: not self._running and not len(self._jobs), timeout)
+
+    def queue_depths(self):
+        """Return the number of queued jobs and upstream waiters per job class"""
+        with self._lock:
+            return {
+                name: (self._jobs.depths[name], self._slot_waiters.depths[name])
+                for name in self._jobs.depths
+            }
+
+
+# Shared scheduler for bot handlers and TMDb requests
+scheduler = PriorityScheduler(SCHEDULER_WORKERS, TMDB_MAX_CONCURRENT_REQUESTS, SCHEDULER_WEIGHTS)
@@ -0,0 +1,154 @@
+"""Perceptual hashing, hash storage and near-duplicate clustering."""
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from artwork_dedup import ArtworkDeduplicator, PerceptualHashStore, dhash
+
+np = pytest.importorskip("numpy")
+
+
+def fixture_image(size, shapes, fmt="JPEG"):
+    """Draw a poster-like test image and return it encoded"""
+    image = Image.new("RGB", size, (20, 40, 90))
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for index, color in enumerate(shapes):
+        # Shapes are placed relative to the size, so rescaled copies look the same
+        left = width * (index + 1) // (len(shapes) + 2)
+        top = height * index // (len(shapes) + 1)
+        draw.rectangle((left, top, left + width // 4, top + height // 3), fill=color)
+    output = io.BytesIO()
+    image.save(output, format=fmt)
+    return output.getvalue()
+
+
+POSTER = [(250, 200, 40), (200, 30, 30), (240, 240, 240)]
+OTHER_POSTER = [(10, 10, 10), (90, 220, 120), (30, 30, 200), (240, 120, 10)]
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_dhash_is_stable_across_resolution_and_format():
+    original = dhash(fixture_image((500, 750), POSTER))
+    rescaled = dhash(fixture_image((92, 138), POSTER, fmt="PNG"))
+
+    assert 0 <= original < 1 << 64
+    assert distance(original, rescaled) <= 6
+
+
+def test_dhash_separates_different_artwork():
+    assert distance(dhash(fixture_image((500, 750), POSTER)), dhash(fixture_image((500, 750), OTHER_POSTER))) > 10
+
+
+def test_hash_store_round_trips_unsigned_64_bit_values(tmp_path):
+    store = PerceptualHashStore(str(tmp_path / "hashes.sqlite3"))
+    hashes = {
+        "/zero.jpg": 0,
+        "/small.jpg": 12345,
+        "/max-signed.jpg": (1 << 63) - 1,
+        "/high-bit.jpg": 1 << 63,
+        "/all-bits.jpg": (1 << 64) - 1,
+    }
+
+    store.put_many(hashes)
+
+    assert store.get_many(list(hashes) + ["/missing.jpg"]) == hashes
+
+
+class StoredHashes:
+    """Hash store preloaded with known values, so nothing is downloaded"""
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def get_many(self, file_paths):
+        return {file_path: self.hashes[file_path] for file_path in file_paths if file_path in self.hashes}
+
+    def put_many(self, hashes):
+        self.hashes.update(hashes)
+
+
+def image(file_path, width):
+    return {"file_path": file_path, "width": width, "height": width * 3 // 2}
+
+
+def test_images_within_threshold_are_collapsed_to_the_largest():
+    base = 0x0F0F_F0F0_1234_5678
+    store = StoredHashes({
+        "/a.jpg": base,
+        "/b.jpg": base ^ 0b111,  # exactly threshold bits away
+        "/c.jpg": base ^ 0xFFFF_0000_0000_0000,
+    })
+    deduplicator = ArtworkDeduplicator(None, store, threshold=3)
+
+    listed = deduplicator.collapse("posters", [image("/a.jpg", 500), image("/b.jpg", 2000), image("/c.jpg", 500)])
+
+    assert [item["file_path"] for item in listed] == ["/b.jpg", "/c.jpg"]
+
+
+def test_images_beyond_threshold_are_kept():
+    base = 0x0F0F_F0F0_1234_5678
+    store = StoredHashes({"/a.jpg": base, "/b.jpg": base ^ 0b1111})  # threshold + 1 bits away
+    deduplicator = ArtworkDeduplicator(None, store, threshold=3)
+
+    listed = deduplicator.collapse("posters", [image("/a.jpg", 500), image("/b.jpg", 2000)])
+
+    assert [item["file_path"] for item in listed] == ["/a.jpg", "/b.jpg"]
+
+
+def test_clusters_are_transitive():
+    base = 1 << 63
+    store = StoredHashes({"/a.jpg": base, "/b.jpg": base ^ 0b11, "/c.jpg": base ^ 0b1111})
+    deduplicator = ArtworkDeduplicator(None, store, threshold=2)
+
+    listed = deduplicator.collapse("posters", [image("/a.jpg", 500), image("/b.jpg", 400), image("/c.jpg", 300)])
+
+    # a-b and b-c are within the threshold, a-c is not, but all three form one cluster
+    assert [item["file_path"] for item in listed] == ["/a.jpg"]
+
+
+def test_unhashed_images_are_listed_while_hashing_in_background(monkeypatch):
+    store = StoredHashes({"/a.jpg": 0})
+    deduplicator = ArtworkDeduplicator(None, store, threshold=3)
+    queued = []
+    monkeypatch.setattr(deduplicator, "_compute_in_background", lambda image_type, file_paths: queued.extend(file_paths))
+
+    listed = deduplicator.collapse("posters", [image("/a.jpg", 500), image("/b.jpg", 500)], wait=False)
+
+    assert [item["file_path"] for item in listed] == ["/a.jpg", "/b.jpg"]
+    assert queued == ["/b.jpg"]
+
+
+def test_images_only_cluster_within_their_language():
+    store = StoredHashes({"/en.jpg": 0, "/de.jpg": 0, "/de-large.jpg": 0b1})
+    deduplicator = ArtworkDeduplicator(None, store, threshold=3)
+    images = [image("/en.jpg", 500), image("/de.jpg", 500), image("/de-large.jpg", 2000)]
+    images[0]["iso_639_1"] = "en"
+    images[1]["iso_639_1"] = images[2]["iso_639_1"] = "de"
+
+    listed = deduplicator.collapse("posters", images)
+
+    assert [item["file_path"] for item in listed] == ["/en.jpg", "/de-large.jpg"]
+
+
+def test_collapsed_listing_is_reused_until_a_hash_changes(monkeypatch):
+    store = StoredHashes({"/a.jpg": 0, "/b.jpg": 0b1})
+    deduplicator = ArtworkDeduplicator(None, store, threshold=3)
+    images = [image("/a.jpg", 500), image("/b.jpg", 2000)]
+    clustered = []
+    representatives = deduplicator._representatives
+    monkeypatch.setattr(deduplicator, "_representatives", lambda *args: clustered.append(1) or representatives(*args))
+
+    deduplicator.collapse("posters", images)
+    listed = deduplicator.collapse("posters", images)
+    assert [item["file_path"] for item in listed] == ["/b.jpg"]
+    assert len(clustered) == 1
+
+    store.hashes["/b.jpg"] = 0xFFFF
+    listed = deduplicator.collapse("posters", images)
+    assert [item["file_path"] for item in listed] == ["/a.jpg", "/b.jpg"]
+    assert len(clustered) == 2
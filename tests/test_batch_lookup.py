@@ -0,0 +1,48 @@
+"""Batch title parsing and progress publishing."""
+import threading
+from concurrent.futures import Future
+
+from batch_lookup import BatchLookup, parse_titles
+
+
+def test_parse_titles_drops_repeats_and_counts_the_overflow():
+    titles, left_out = parse_titles("/batch Inception\n\n  inception \nThe  Matrix\nAlien\nHeat", 3)
+
+    assert titles == ["Inception", "The Matrix", "Alien"]
+    assert left_out == 1
+
+
+def search_result(title):
+    future = Future()
+    future.set_result({"results": [{"media_type": "movie", "title": title}]})
+    return future
+
+
+class InterleavingLock:
+    """Lock that runs a callback just before it is first acquired"""
+
+    def __init__(self, before_first_acquire):
+        self._lock = threading.Lock()
+        self._before = before_first_acquire
+
+    def acquire(self, blocking=True):
+        before, self._before = self._before, None
+        if before:
+            before()
+        return self._lock.acquire(blocking)
+
+    def release(self):
+        self._lock.release()
+
+
+def test_progress_that_loses_the_race_does_not_replace_the_final_results():
+    published = []
+    lookup = BatchLookup(None, ["Inception", "Alien"], lambda results, done: published.append(done), 0)
+    # The last lookup finishes and publishes between the first one passing
+    # the interval check and taking the publish lock
+    lookup._publish_lock = InterleavingLock(lambda: lookup._resolved(1, search_result("Alien")))
+
+    lookup._resolved(0, search_result("Inception"))
+
+    assert published == [True]
+    assert [match["title"] for match in lookup.results] == ["Inception", "Alien"]
@@ -0,0 +1,110 @@
+"""Conditional GET revalidation of cached TMDb responses against a local stub server."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cache import FRESH
+from metrics import metrics
+from tmdb_api import TMDbAPI, compact_details
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+PATH = "/movie/27205"
+PARAMS = {"language": "en-US"}
+KEY = (PATH, tuple(sorted(PARAMS.items())))
+BODY = b'{"id": 27205, "title": "Inception", "images": {"posters": [], "backdrops": [], "logos": []}}'
+
+
+class StubTMDb:
+    """Answers 200 with validators, or 304 when the request carries a matching ETag"""
+
+    def __init__(self):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                if self.headers.get("If-None-Match") == ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", ETAG)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", ETAG)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(len(BODY)))
+                self.end_headers()
+                self.wfile.write(BODY)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub():
+    stub = StubTMDb()
+    yield stub
+    stub.server.shutdown()
+
+
+@pytest.fixture
+def api(stub):
+    api = TMDbAPI()
+    api.base_url = stub.url
+    return api
+
+
+def test_first_request_stores_validators(api, stub):
+    data = api._get("details", PATH, PARAMS, compact_details)
+
+    assert data["title"] == "Inception"
+    assert "If-None-Match" not in stub.requests[0]
+    entry = api.cache.get(KEY)
+    assert entry.etag == ETAG
+    assert entry.last_modified == LAST_MODIFIED
+    assert entry.size == len(BODY)
+
+
+def test_expired_entry_is_revalidated_with_validators(api, stub):
+    api._get("details", PATH, PARAMS, compact_details)
+    # Make the entry too old to be served without revalidation
+    api.cache.get(KEY).fetched_at = 0
+    saved_before = metrics.get("tmdb.cache.bytes_saved")
+    revalidated_before = metrics.get("tmdb.cache.revalidated")
+
+    data = api._get("details", PATH, PARAMS, compact_details)
+
+    assert data["title"] == "Inception"
+    assert stub.requests[1]["If-None-Match"] == ETAG
+    assert stub.requests[1]["If-Modified-Since"] == LAST_MODIFIED
+    # The 304 made the entry fresh again without a new body
+    assert api.cache.freshness(api.cache.get(KEY)) == FRESH
+    assert metrics.get("tmdb.cache.revalidated") == revalidated_before + 1
+    assert metrics.get("tmdb.cache.bytes_saved") == saved_before + len(BODY)
+
+
+def test_entry_evicted_during_revalidation_is_stored_again(api, stub):
+    api._get("details", PATH, PARAMS, compact_details)
+    entry = api.cache.get(KEY)
+    # Simulate the entry being evicted while the request is in flight
+    api.cache._entries.clear()
+
+    data = api._fetch("details", KEY, PATH, PARAMS, compact_details, entry)
+
+    assert data == entry.value
+    assert stub.requests[1]["If-None-Match"] == ETAG
+    stored = api.cache.get(KEY)
+    assert stored.value == entry.value
+    assert stored.etag == ETAG
+    assert stored.size == len(BODY)
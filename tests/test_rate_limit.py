@@ -0,0 +1,43 @@
+"""Per-key token buckets and admission across user and chat limiters."""
+import threading
+
+from rate_limit import KeyedRateLimiter, admit
+
+
+def limiters(user_burst, chat_burst):
+    lock = threading.Lock()
+    return (
+        KeyedRateLimiter("user", 0, user_burst, 100, 3600, lock),
+        KeyedRateLimiter("chat", 0, chat_burst, 100, 3600, lock),
+    )
+
+
+def test_rejection_by_the_chat_costs_the_user_no_token():
+    user_limiter, chat_limiter = limiters(user_burst=1, chat_burst=1)
+
+    assert admit([(user_limiter, 1), (chat_limiter, 10)])
+    assert not admit([(user_limiter, 2), (chat_limiter, 10)])
+
+    # User 2 was rejected by the chat, so its token is still there
+    assert admit([(user_limiter, 2), (chat_limiter, 20)])
+    assert chat_limiter.top_limited() == [(10, 1)]
+    assert user_limiter.top_limited() == []
+
+
+def test_concurrent_requests_never_overdraw_a_bucket():
+    user_limiter, chat_limiter = limiters(user_burst=5, chat_burst=1000)
+    admitted = []
+    start = threading.Barrier(20)
+
+    def request(chat_id):
+        start.wait()
+        admitted.append(admit([(user_limiter, 1), (chat_limiter, chat_id)]))
+
+    threads = [threading.Thread(target=request, args=(chat_id,)) for chat_id in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert admitted.count(True) == 5
+    assert user_limiter.top_limited() == [(1, 15)]
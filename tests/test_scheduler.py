@@ -0,0 +1,38 @@
+"""Draining the priority scheduler."""
+import threading
+import time
+
+from scheduler import BACKGROUND, BULK, PriorityScheduler
+
+
+def make_scheduler():
+    return PriorityScheduler(2, 2, {"interactive": 8, "bulk": 2, "background": 1})
+
+
+def test_join_waits_for_jobs_submitted_by_running_jobs():
+    scheduler = make_scheduler()
+    finished = []
+
+    def follow_up():
+        time.sleep(0.05)
+        finished.append("follow-up")
+
+    def job():
+        time.sleep(0.05)
+        finished.append("job")
+        scheduler.submit(BACKGROUND, follow_up)
+
+    scheduler.submit(BULK, job)
+
+    assert scheduler.join(timeout=5)
+    assert finished == ["job", "follow-up"]
+
+
+def test_join_times_out_while_a_job_is_running():
+    scheduler = make_scheduler()
+    release = threading.Event()
+    scheduler.submit(BULK, release.wait)
+
+    assert not scheduler.join(timeout=0.05)
+    release.set()
+    assert scheduler.join(timeout=5)
@@ -0,0 +1,61 @@
+"""Anonymization of recorded Telegram updates."""
+import json
+
+from traffic_recorder import ANONYMOUS_NAME, TrafficRecorder
+
+ALICE = {"id": 1001, "is_bot": False, "first_name": "Alice", "last_name": "Smith", "username": "alice"}
+BOB = {"id": 1002, "is_bot": False, "first_name": "Bob", "username": "bobby"}
+GROUP = {"id": -100555, "type": "supergroup", "title": "Film Club", "username": "filmclub"}
+
+
+def find_personal_data(data):
+    """Return every real id or name found anywhere in recorded data"""
+    text = json.dumps(data)
+    return [value for value in ("1001", "1002", "100555", "Alice", "Smith", "alice", "Bob", "bobby",
+                                "Film Club", "filmclub", "Carol", "Editor Dave") if value in text]
+
+
+def test_service_messages_are_anonymized(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), "salt", 3600)
+    update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 5,
+            "date": 0,
+            "chat": GROUP,
+            "from": ALICE,
+            "new_chat_members": [ALICE, BOB],
+            "new_chat_member": BOB,
+            "left_chat_member": BOB,
+        },
+    }
+
+    recorded = recorder._anonymize(update)
+
+    assert find_personal_data(recorded) == []
+    message = recorded["message"]
+    assert [member["first_name"] for member in message["new_chat_members"]] == [ANONYMOUS_NAME, ANONYMOUS_NAME]
+    # Pseudonyms are stable, so the same person gets the same id everywhere
+    assert message["new_chat_members"][1]["id"] == message["left_chat_member"]["id"]
+    assert message["chat"]["id"] < 0
+    assert message["chat"]["type"] == "supergroup"
+
+
+def test_forwarded_names_and_signatures_are_dropped(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), "salt", 3600)
+    update = {
+        "update_id": 2,
+        "channel_post": {
+            "message_id": 6,
+            "date": 0,
+            "chat": GROUP,
+            "text": "/tmdb Inception",
+            "forward_sender_name": "Carol",
+            "author_signature": "Editor Dave",
+        },
+    }
+
+    recorded = recorder._anonymize(update)
+
+    assert find_personal_data(recorded) == []
+    assert recorded["channel_post"]["text"] == "/tmdb Inception"
@@ -1,53 +1,286 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import logging
-from config import TMDB_API_KEY, TMDB_API_BASE_URL, TMDB_IMAGE_BASE_URL, POSTER_SIZES, BACKDROP_SIZES, LOGO_SIZES
+from config import (
+    TMDB_API_KEY, TMDB_API_BASE_URL, TMDB_IMAGE_BASE_URL, POSTER_SIZES, BACKDROP_SIZES, LOGO_SIZES, STILL_SIZES,
+    CACHE_MAX_ENTRIES, CACHE_SOFT_TTL, CACHE_HARD_TTL, CACHE_BACKEND, CACHE_DB_PATH, TMDB_REQUEST_TIMEOUT,
+    TMDB_MAX_CONCURRENT_REQUESTS,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_SLOW_CALL_THRESHOLD, BREAKER_OPEN_TIMEOUT, BREAKER_HALF_OPEN_MAX_CALLS
+)
+from cache import create_cache, FRESH, STALE
+from circuit_breaker import CircuitBreaker
+from metrics import metrics
+from scheduler import scheduler, BACKGROUND
+from tracing import tracer, SPAN_KIND_CLIENT
+import json_codec
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Fields of search results and details used by the bot; everything else is
+# dropped before caching to keep cached entries small
+SEARCH_RESULT_FIELDS = ("id", "media_type", "title", "name", "release_date", "first_air_date")
+DETAILS_FIELDS = (
+    "id", "title", "name", "overview", "release_date", "first_air_date", "runtime",
+    "number_of_seasons", "number_of_episodes", "vote_average", "poster_path", "backdrop_path"
+)
+IMAGE_FIELDS = ("file_path", "iso_639_1", "width", "height")
+SEASON_FIELDS = ("season_number", "name", "air_date", "episode_count", "poster_path")
+EPISODE_FIELDS = ("episode_number", "name", "air_date", "still_path")
+# Languages of images requested with details and seasons
+IMAGE_LANGUAGES = "en,hi,ta,te,bn,null"
+
+def _pick(data, fields):
+    """Return only the given fields of a dict"""
+    return {field: data[field] for field in fields if field in data}
+
+def compact_search(data):
+    """Reduce a search response to the fields used by the bot"""
+    results = [_pick(item, SEARCH_RESULT_FIELDS) for item in data.get("results", [])]
+    return {"page": data.get("page"), "total_results": data.get("total_results"), "results": results}
+
+def compact_details(data):
+    """Reduce a details response to the fields used by the bot"""
+    compact = _pick(data, DETAILS_FIELDS)
+    images = data.get("images") or {}
+    compact["images"] = {
+        kind: [_pick(image, IMAGE_FIELDS) for image in images.get(kind, [])]
+        for kind in ("posters", "backdrops", "logos")
+    }
+    if "seasons" in data:
+        compact["seasons"] = [_pick(season, SEASON_FIELDS) for season in data["seasons"]]
+    return compact
+
+def compact_season(data):
+    """Reduce a season response to the fields used by the bot"""
+    compact = _pick(data, SEASON_FIELDS)
+    compact["episodes"] = [_pick(episode, EPISODE_FIELDS) for episode in data.get("episodes", [])]
+    images = data.get("images") or {}
+    compact["images"] = {"posters": [_pick(image, IMAGE_FIELDS) for image in images.get("posters", [])]}
+    return compact
+
 class TMDbAPI:
     def __init__(self):
         self.api_key = TMDB_API_KEY
         self.base_url = TMDB_API_BASE_URL
         self.image_base_url = TMDB_IMAGE_BASE_URL
-    
+        self.cache = create_cache(CACHE_BACKEND, CACHE_DB_PATH, CACHE_MAX_ENTRIES, CACHE_SOFT_TTL, CACHE_HARD_TTL)
+        # A shared session reuses connections; requests decompresses gzip/deflate bodies
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        # Optional TrafficRecorder that receives every fetched response
+        self.recorder = None
+        # Threads for fan-out requests; the shared upstream slots still bound concurrency
+        self._fanout = ThreadPoolExecutor(max_workers=TMDB_MAX_CONCURRENT_REQUESTS, thread_name_prefix="tmdb-fanout")
+
     def search_multi(self, query, language="en-US", page=1):
         """Search for movies, TV shows, and people in a single request"""
-        endpoint = f"{self.base_url}/search/multi"
         params = {
-            "api_key": self.api_key,
             "query": query,
             "language": language,
             "page": page,
             "include_adult": False
         }
-        
-        try:
-            response = requests.get(endpoint, params=params, timeout=10)
-            return response.json() if response.status_code == 200 else None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error searching TMDb: {e}")
-            return None
-    
+        return self._get("search", "/search/multi", params, compact_search)
+
     def get_details(self, media_type, media_id, language="en-US"):
         """Get detailed information about a specific movie or TV show"""
         if media_type not in ["movie", "tv"]:
             return None
-            
-        endpoint = f"{self.base_url}/{media_type}/{media_id}"
+
         params = {
-            "api_key": self.api_key,
             "language": language,
             "append_to_response": "images",
-            "include_image_language": "en,hi,ta,te,bn,null"  # Include images in all supported languages
+            "include_image_language": IMAGE_LANGUAGES  # Include images in all supported languages
         }
-        
+        return self._get("details", f"/{media_type}/{media_id}", params, compact_details)
+
+    def get_season(self, tv_id, season_number, language="en-US"):
+        """Get the episodes and posters of one season of a TV show"""
+        params = {
+            "language": language,
+            "append_to_response": "images",
+            "include_image_language": IMAGE_LANGUAGES
+        }
+        return self._get("season", f"/tv/{tv_id}/season/{season_number}", params, compact_season)
+
+    def get_seasons(self, tv_id, season_numbers, language="en-US"):
+        """Get several seasons concurrently; returns {season number: season or None}.
+
+        Each season is requested and cached on its own, so later views of a
+        single season are served from the cache. Requests run in copies of
+        the caller's context and so keep its job class and trace.
+        """
+        futures = {
+            number: self._fanout.submit(contextvars.copy_context().run, self.get_season, tv_id, number, language)
+            for number in season_numbers
+        }
+        seasons = {}
+        for number, future in futures.items():
+            try:
+                seasons[number] = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching season {number} of TV show {tv_id}: {e}")
+                seasons[number] = None
+        return seasons
+
+    def _get(self, family, path, params, compact):
+        """Get a TMDb resource, serving cached responses where possible.
+
+        Fresh entries are returned directly. Stale entries are returned
+        immediately and refreshed in the background. Expired entries are only
+        returned when the upstream request fails or its circuit is open.
+        ``compact`` reduces a decoded response to what gets cached.
+        """
+        with tracer.span(f"tmdb.{family}", **{"url.path": path}) as span:
+            key = (path, tuple(sorted(params.items())))
+            entry = self.cache.get(key)
+
+            if entry is not None:
+                state = self.cache.freshness(entry)
+                span.set_attribute("cache.state", state)
+                if state == FRESH:
+                    metrics.increment("tmdb.cache.hit")
+                    return entry.value
+                if state == STALE:
+                    metrics.increment("tmdb.cache.stale_served")
+                    self._refresh_in_background(family, key, path, params, compact)
+                    return entry.value
+
+            metrics.increment("tmdb.cache.miss")
+            data = self._fetch(family, key, path, params, compact, entry)
+            if data is None and entry is not None:
+                metrics.increment("tmdb.cache.stale_on_error")
+                span.set_attribute("cache.stale_on_error", True)
+                logger.warning(f"Serving expired cache entry for {path} after upstream failure")
+                return entry.value
+            return data
+
+    def _fetch(self, family, key, path, params, compact, entry=None):
+        """Request a resource from TMDb and store a successful response in the cache.
+
+        When a cached entry is given, its validators are sent so that TMDb can
+        answer with 304 Not Modified instead of the full body.
+        """
+        breaker = self._get_breaker(family)
+        if not breaker.allow_request():
+            return None
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
         try:
-            response = requests.get(endpoint, params=params, timeout=10)
-            return response.json() if response.status_code == 200 else None
+            # Requests share a limited number of slots, granted by job priority
+            with scheduler.upstream_slot():
+                with tracer.span("tmdb.request", SPAN_KIND_CLIENT, **{"http.method": "GET", "url.path": path}) as span:
+                    started = time.monotonic()
+                    response = self.session.get(
+                        f"{self.base_url}{path}",
+                        params={"api_key": self.api_key, **params},
+                        headers=headers,
+                        timeout=TMDB_REQUEST_TIMEOUT
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting details from TMDb: {e}")
+            breaker.record_failure()
+            metrics.increment("tmdb.upstream.errors")
+            metrics.mark("tmdb.upstream.requests")
+            metrics.mark("tmdb.upstream.errors")
+            logger.error(f"Error fetching {path} from TMDb: {e}")
             return None
+
+        elapsed = time.monotonic() - started
+        metrics.mark("tmdb.upstream.requests")
+        metrics.record_latency("tmdb.upstream", elapsed)
+
+        # Only server errors and rate limiting count against the circuit
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success(elapsed)
+
+        if response.status_code == 304 and entry is not None:
+            metrics.increment("tmdb.cache.revalidated")
+            metrics.increment("tmdb.cache.bytes_saved", entry.size)
+            if self.cache.touch(key) is None:
+                # The entry was evicted while the request was in flight
+                self.cache.set(key, entry.value, entry.etag, entry.last_modified, entry.size)
+            return entry.value
+
+        if response.status_code != 200:
+            metrics.increment("tmdb.upstream.errors")
+            metrics.mark("tmdb.upstream.errors")
+            if self.recorder is not None:
+                self.recorder.record_response(path, params, response.status_code, None)
+            return None
+
+        try:
+            with tracer.span("tmdb.decode", **{"decoder": json_codec.DECODER, "body.size": len(response.content)}):
+                data = compact(json_codec.loads(response.content))
+        except ValueError as e:
+            metrics.increment("tmdb.upstream.errors")
+            metrics.mark("tmdb.upstream.errors")
+            logger.error(f"Error decoding {path} from TMDb: {e}")
+            return None
+
+        if self.recorder is not None:
+            self.recorder.record_response(path, params, response.status_code, data)
+
+        self.cache.set(
+            key,
+            data,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            size=len(response.content)
+        )
+        return data
+
+    def _get_breaker(self, family):
+        """Return the circuit breaker for an endpoint family"""
+        with self._breakers_lock:
+            breaker = self._breakers.get(family)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    family,
+                    BREAKER_FAILURE_THRESHOLD,
+                    BREAKER_SLOW_CALL_THRESHOLD,
+                    BREAKER_OPEN_TIMEOUT,
+                    BREAKER_HALF_OPEN_MAX_CALLS
+                )
+                self._breakers[family] = breaker
+            return breaker
+
+    def breaker_states(self):
+        """Return the circuit state of each endpoint family used so far"""
+        with self._breakers_lock:
+            return {family: breaker.state for family, breaker in self._breakers.items()}
+
+    def _refresh_in_background(self, family, key, path, params, compact):
+        """Refresh a stale cache entry without blocking the caller"""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(family, key, path, params, compact, self.cache.get(key))
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        scheduler.submit(BACKGROUND, refresh)
     
     def get_poster_url(self, poster_path, size="medium"):
         """Generate poster URL from poster path"""
@@ -65,6 +298,14 @@ class TMDbAPI:
         size_key = BACKDROP_SIZES.get(size, "medium")
         return f"{self.image_base_url}/{size_key}{backdrop_path}"
         
+    def get_still_url(self, still_path, size="medium"):
+        """Generate episode still URL from still path"""
+        if not still_path:
+            return None
+            
+        size_key = STILL_SIZES.get(size, "medium")
+        return f"{self.image_base_url}/{size_key}{still_path}"
+        
     def get_logo_url(self, logo_path, size="medium"):
         """Generate logo URL from logo path"""
         if not logo_path:
@@ -0,0 +1,265 @@
+import contextvars
+import functools
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from telegram import Bot
+from telegram.utils.request import Request
+from config import TRACE_SAMPLE_RATE, TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
+from metrics import metrics
+import json_codec
+
+# Span of the code currently running, or None when the update is not traced
+_current_span = contextvars.ContextVar("span", default=None)
+
+SERVICE_NAME = "tmdb-poster-bot"
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+# Receipt times kept for updates that have not been handled yet
+RECEIPT_HISTORY = 10000
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "status", "_token")
+
+    def __init__(self, tracer, trace_id, parent_id, name, kind, attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = STATUS_UNSET
+        self._token = None
+
+    def set_attribute(self, key, value):
+        """Attach an attribute to the span"""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = STATUS_ERROR
+            self.attributes["exception.type"] = exc_type.__name__
+        self.tracer.export(self)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in for spans of updates that are not traced"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledTrace:
+    """Context for an update that is not sampled; its code sees no current span"""
+
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current_span.set(None)
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+def _attribute_value(value):
+    """Encode an attribute value as an OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Samples updates and exports their spans to a rotating JSON-lines file.
+
+    Each line is an OTLP/JSON ``ExportTraceServiceRequest`` holding one span,
+    the format read by the OpenTelemetry Collector's file receiver. Every
+    process writes its own file, named with its pid, because a rotating file
+    cannot be shared between processes. The trace id travels in a context
+    variable, so spans opened anywhere below a traced handler join its
+    trace. When tracing is disabled or an update is not sampled, ``span``
+    returns a shared no-op object.
+    """
+
+    def __init__(self, path, sample_rate, max_bytes, backup_count):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = bool(path) and sample_rate > 0
+        self._logger = None
+        self._logger_lock = threading.Lock()
+
+    def _export_logger(self):
+        """Return the logger writing this process's trace file, opening it on first use"""
+        with self._logger_lock:
+            if self._logger is None:
+                root, ext = os.path.splitext(self.path)
+                handler = logging.handlers.RotatingFileHandler(
+                    f"{root}-{os.getpid()}{ext}", maxBytes=self.max_bytes, backupCount=self.backup_count
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger = logging.getLogger(f"tracing.export.{os.getpid()}")
+                self._logger.addHandler(handler)
+                self._logger.setLevel(logging.INFO)
+                self._logger.propagate = False
+            return self._logger
+
+    def start_trace(self, name, **attributes):
+        """Start a new trace for an update, subject to sampling"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return _UnsampledTrace()
+        return Span(self, os.urandom(16).hex(), None, name, SPAN_KIND_SERVER, attributes)
+
+    def span(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        """Start a child span of the current span, if the current update is traced"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, parent.trace_id, parent.span_id, name, kind, attributes)
+
+    def export(self, span):
+        """Write a finished span"""
+        record = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": span.status},
+        }
+        if span.parent_id:
+            record["parentSpanId"] = span.parent_id
+
+        line = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ]},
+                "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [record]}],
+            }]
+        }
+        self._export_logger().info(json_codec.dumps(line).decode("utf-8"))
+
+
+def current_span():
+    """Return the current span, or a no-op span when the update is not traced"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def mark_received(update_id, received_at=None):
+    """Record when an update was received from Telegram, for its trace"""
+    if not tracer.enabled:
+        return
+    with _receipts_lock:
+        _receipts[update_id] = received_at or time.time()
+        if len(_receipts) > RECEIPT_HISTORY:
+            _receipts.popitem(last=False)
+
+
+def received_at(update_id):
+    """Return when an update was received from Telegram, or None"""
+    with _receipts_lock:
+        return _receipts.get(update_id)
+
+
+def traced(name):
+    """Decorator that starts a trace for each update passed to a handler"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(update, context):
+            if not tracer.enabled:
+                return handler(update, context)
+            with tracer.start_trace(name, **{"telegram.update_id": update.update_id}) as span:
+                # Time between the bot receiving the update and it being handled
+                received = received_at(update.update_id)
+                if received:
+                    span.set_attribute("telegram.queue_wait_ms", int((time.time() - received) * 1000))
+                # Time between Telegram receiving the message and it being handled
+                if update.message and update.message.date:
+                    span.set_attribute("telegram.update_age_ms", int((time.time() - update.message.date.timestamp()) * 1000))
+                return handler(update, context)
+        return wrapper
+    return decorator
+
+
+class TracingBot(Bot):
+    """Bot that records when each polled update was received"""
+
+    def get_updates(self, *args, **kwargs):
+        updates = super().get_updates(*args, **kwargs)
+        now = time.time()
+        for update in updates:
+            mark_received(update.update_id, now)
+        return updates
+
+
+class TracingRequest(Request):
+    """Telegram request sender that records each Bot API call as a client span.
+
+    It also keeps a gauge of Bot API calls in flight, the bot's send queue.
+    The long poll for updates is always open, so it is not counted.
+    """
+
+    def post(self, url, data, timeout=None):
+        method = url.rsplit("/", 1)[-1]
+        if method == "getUpdates":
+            return super().post(url, data, timeout=timeout)
+        metrics.increment("telegram.requests_in_flight")
+        try:
+            with tracer.span(f"telegram.{method}", SPAN_KIND_CLIENT, **{"rpc.method": method}):
+                return super().post(url, data, timeout=timeout)
+        finally:
+            metrics.increment("telegram.requests_in_flight", -1)
+
+
+# Receipt times by update id, oldest first
+_receipts = OrderedDict()
+_receipts_lock = threading.Lock()
+
+# Shared tracer
+tracer = Tracer(TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT)
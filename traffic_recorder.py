@@ -0,0 +1,128 @@
+import atexit
+import gzip
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+import json_codec
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Personal fields removed from recorded users and chats
+PERSONAL_FIELDS = ("first_name", "last_name", "username", "title", "bio", "description", "invite_link")
+# Placeholder for first_name, which the Bot API always sends for users
+ANONYMOUS_NAME = "User"
+# Free-text fields that may name a person, dropped wherever they appear
+NAME_FIELDS = ("forward_sender_name", "author_signature")
+# Objects with personal data that replays do not need
+DROPPED_OBJECTS = ("contact", "location", "venue")
+
+
+def is_identity(value):
+    """Return whether update data is a user or chat, whose id identifies a person or group"""
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("id"), int)
+        and ("first_name" in value or "is_bot" in value or "type" in value)
+    )
+
+
+class TrafficRecorder:
+    """Records anonymized Telegram updates and TMDb responses for replay.
+
+    Records are written as gzip-compressed JSON lines, one file per
+    rotation period. Every record carries ``t``, the seconds since the
+    recorder started, so replays can keep the original timing. User and
+    chat ids are replaced by salted hashes and names are removed.
+    """
+
+    def __init__(self, directory, salt, rotate_seconds):
+        self.directory = directory
+        self.salt = (salt or secrets.token_hex(16)).encode("utf-8")
+        self.rotate_seconds = rotate_seconds
+        self._started = time.monotonic()
+        self._file = None
+        self._file_opened = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+    def _anonymize_id(self, value):
+        """Map an id to a stable pseudonym, keeping its sign (negative ids are groups)"""
+        digest = hashlib.sha256(self.salt + str(abs(value)).encode("utf-8")).digest()
+        pseudonym = int.from_bytes(digest[:6], "big") + 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def _anonymize(self, data):
+        """Return a copy of update data without personal information.
+
+        Users and chats are found by their shape wherever they appear, so
+        service messages such as new_chat_members are covered too.
+        """
+        if isinstance(data, list):
+            return [self._anonymize(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+
+        if is_identity(data):
+            named = "first_name" in data
+            data = {key: value for key, value in data.items() if key not in PERSONAL_FIELDS}
+            if named:
+                data["first_name"] = ANONYMOUS_NAME
+            data["id"] = self._anonymize_id(data["id"])
+
+        return {
+            key: self._anonymize(value)
+            for key, value in data.items()
+            if key not in DROPPED_OBJECTS and key not in NAME_FIELDS
+        }
+
+    def _write(self, record):
+        """Append a record to the current file, rotating it when due"""
+        record["t"] = round(time.monotonic() - self._started, 4)
+        line = json_codec.dumps(record) + b"\n"
+        with self._lock:
+            now = time.monotonic()
+            if self._file is None or now - self._file_opened >= self.rotate_seconds:
+                self._rotate(now)
+            self._file.write(line)
+
+    def _rotate(self, now):
+        """Start a new recording file; must be called with the lock held"""
+        if self._file is not None:
+            self._file.close()
+        name = f"traffic-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), "ab")
+        self._file_opened = now
+        logger.info(f"Recording traffic to {name}")
+
+    def record_update(self, update):
+        """Record an incoming Telegram update"""
+        try:
+            self._write({"type": "update", "update": self._anonymize(update.to_dict())})
+        except Exception as e:
+            logger.error(f"Error recording update: {e}")
+
+    def record_response(self, path, params, status, data):
+        """Record a TMDb response as it is cached"""
+        try:
+            self._write({"type": "tmdb", "path": path, "params": params, "status": status, "body": data})
+        except Exception as e:
+            logger.error(f"Error recording TMDb response: {e}")
+
+    def close(self):
+        """Flush and close the current file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def create_recorder(directory, salt, rotate_seconds):
+    """Create a traffic recorder, or None when recording is disabled"""
+    if not directory:
+        return None
+    return TrafficRecorder(directory, salt, rotate_seconds)
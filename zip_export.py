@@ -0,0 +1,179 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import requests
+from config import ZIP_EXPORT_DOWNLOADS, ZIP_EXPORT_PART_SIZE, IMAGE_CACHE_DIR, TMDB_REQUEST_TIMEOUT
+from metrics import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Downloaded images larger than this are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 1024 * 1024
+# Room left in each part for ZIP headers and the central directory
+ZIP_ENTRY_OVERHEAD = 1024
+
+
+class _ExportJob:
+    """An export shared by every request for the same artwork"""
+
+    def __init__(self):
+        self.future = Future()
+        self.users = 0
+        self.directory = tempfile.mkdtemp(prefix="tmdb-export-")
+
+
+class ZipExporter:
+    """Streams artwork into ZIP files split at Telegram's upload limit.
+
+    Each export downloads its images on its own small thread pool and
+    copies them into the archive chunk by chunk, so no more than a few
+    images are held at once. Identical exports requested while one is
+    running share its result.
+    """
+
+    def __init__(self, tmdb):
+        self.tmdb = tmdb
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, url):
+        """Return the local image cache path for an image URL, or None"""
+        if not IMAGE_CACHE_DIR:
+            return None
+        relative = url[len(self.tmdb.image_base_url):].lstrip("/")
+        return os.path.join(IMAGE_CACHE_DIR, *relative.split("/"))
+
+    def _download(self, url):
+        """Download one image into a spooled temporary file, returning None on failure"""
+        cache_path = self._cache_path(url)
+        if cache_path and os.path.exists(cache_path):
+            metrics.increment("zip_export.image_cache.hit")
+            return open(cache_path, "rb")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            with self.tmdb.session.get(url, stream=True, timeout=TMDB_REQUEST_TIMEOUT) as response:
+                if response.status_code != 200:
+                    spool.close()
+                    return None
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    spool.write(chunk)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Error downloading {url}: {e}")
+            spool.close()
+            return None
+
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            spool.seek(0)
+            partial_path = f"{cache_path}.{threading.get_ident()}.part"
+            with open(partial_path, "wb") as cached:
+                shutil.copyfileobj(spool, cached, CHUNK_SIZE)
+            os.replace(partial_path, cache_path)
+
+        spool.seek(0)
+        return spool
+
+    def _fetch_in_order(self, downloads, images):
+        """Yield (name, file) pairs in order with a bounded number of downloads in flight"""
+        pending = deque()
+        images = iter(images)
+        for name, url in images:
+            pending.append((name, downloads.submit(self._download, url)))
+            if len(pending) >= ZIP_EXPORT_DOWNLOADS * 2:
+                break
+
+        while pending:
+            name, future = pending.popleft()
+            next_image = next(images, None)
+            if next_image is not None:
+                pending.append((next_image[0], downloads.submit(self._download, next_image[1])))
+            yield name, future.result()
+
+    def _build(self, directory, base_name, images):
+        """Write the images into one or more ZIP parts and return their paths"""
+        parts = []
+        archive = None
+        output = None
+
+        def start_part():
+            path = os.path.join(directory, f"{base_name}_part{len(parts) + 1}.zip")
+            parts.append(path)
+            stream = open(path, "wb")
+            return stream, zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED)
+
+        downloads = ThreadPoolExecutor(max_workers=ZIP_EXPORT_DOWNLOADS, thread_name_prefix="zip-download")
+        try:
+            for name, image in self._fetch_in_order(downloads, images):
+                if image is None:
+                    continue
+                with image:
+                    image.seek(0, os.SEEK_END)
+                    size = image.tell()
+                    image.seek(0)
+
+                    if archive is None:
+                        output, archive = start_part()
+                    elif archive.namelist() and output.tell() + size + ZIP_ENTRY_OVERHEAD > ZIP_EXPORT_PART_SIZE:
+                        archive.close()
+                        output.close()
+                        output, archive = start_part()
+
+                    with archive.open(name, "w", force_zip64=True) as entry:
+                        shutil.copyfileobj(image, entry, CHUNK_SIZE)
+        finally:
+            downloads.shutdown(wait=False)
+            if archive is not None:
+                archive.close()
+                output.close()
+
+        if len(parts) == 1:
+            # A single archive does not need a part number
+            single = os.path.join(directory, f"{base_name}.zip")
+            os.replace(parts[0], single)
+            parts = [single]
+        return parts
+
+    @contextmanager
+    def export(self, key, base_name, images):
+        """Export images as ZIP parts, sharing the work with identical requests.
+
+        ``images`` is a list of (archive name, URL) pairs. Yields the paths
+        of the finished parts, which are removed once every user is done.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            owner = job is None
+            if owner:
+                job = _ExportJob()
+                self._jobs[key] = job
+            else:
+                metrics.increment("zip_export.shared")
+            job.users += 1
+
+        try:
+            if owner:
+                metrics.increment("zip_export.started")
+                try:
+                    job.future.set_result(self._build(job.directory, base_name, images))
+                except Exception as e:
+                    job.future.set_exception(e)
+                finally:
+                    # Later requests start a new export instead of reusing finished files
+                    with self._lock:
+                        self._jobs.pop(key, None)
+            yield job.future.result()
+        finally:
+            with self._lock:
+                job.users -= 1
+                finished = job.users == 0
+            if finished:
+                shutil.rmtree(job.directory, ignore_errors=True)